@@ -1,20 +1,21 @@
 
 import streamlit as st
 import os
-import json
 import time
-from src import ingestion, synthesis, assets, video
+from src import ingestion, video, metrics, jobs
 
 # Config
-DATA_DIR = "data"
-ASSETS_DIR = "assets"
-REPORTS_DIR = "reports"
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(ASSETS_DIR, exist_ok=True)
-os.makedirs(REPORTS_DIR, exist_ok=True)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
 
 st.set_page_config(page_title="Refactored AI Video", page_icon="🎬", layout="wide")
 
+@st.cache_resource
+def get_job_service():
+    # One service per server process, shared by every session
+    return jobs.JobService(workers=JOB_WORKERS)
+
+job_service = get_job_service()
+
 # Custom CSS for Premium Look
 st.markdown("""
 <style>
@@ -124,6 +125,9 @@ with st.sidebar:
 
     
     use_pexels = st.checkbox("Use Stock Video (Real Footages)", value=True if pexels_key_input else False)
+    render_backend = st.selectbox("Render Engine", video.RENDER_BACKENDS, help="ffmpeg renders natively in a single pass; parallel encodes segments on every core and reuses unchanged ones; moviepy composites frame by frame; streaming is moviepy with memory bounded by one segment, for long scripts.")
+    encoder_profile = st.selectbox("Encoder Profile", [jobs.AUTO_PROFILE, *video.ENCODER_PROFILES], help="draft is fast and small, archive is 1080p with the best compression; auto stays at 720p and trades encode speed for size by how many jobs are waiting.")
+    image_motion = st.selectbox("Image Motion", list(video.MOTION_PRESETS), index=list(video.MOTION_PRESETS).index(video.DEFAULT_MOTION), help="Camera move for segments that use a still image.")
 
 # Main Interface
 col1, col2 = st.columns([1, 1])
@@ -138,11 +142,14 @@ with col1:
     else:
         if st.button("Fetch Trending Topics"):
             with st.spinner("Scraping Google News..."):
-                # Simple fetch of top headline
-                news = ingestion.fetch_news_topic("Technology")
+                # Simple fetch of top headline; this session's own span, the recorder is shared by every session
+                with metrics.span("ingestion.fetch", topic="Technology") as fetch_span:
+                    news = ingestion.fetch_news_topic("Technology")
                 if news:
                     st.success(f"Found: {news['title']}")
                     st.session_state['news_data'] = news
+                    # Handed to the job, so the video's report includes the fetch
+                    st.session_state['ingestion_timing'] = [fetch_span.to_dict()]
                 else:
                     st.error("No news found.")
     
@@ -156,79 +163,48 @@ with col2:
         if not api_key_input and not groq_key_input:
             st.error("Missing API Key (Gemini or Groq)")
         else:
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            # 1. Content Prep
-            status_text.text("Preparing Content...")
-            news_item = {}
             if mode == "Trending News" and 'news_data' in st.session_state:
                 news_item = st.session_state['news_data']
             else:
                 news_item = {"title": topic_text, "content": f"A video about {topic_text}"}
-            progress_bar.progress(10)
-            
-            # 2. Synthesis
-            status_text.text("AI Scripting...")
-            script = synthesis.generate_script(news_item, gemini_key=api_key_input, groq_key=groq_key_input)
-            if not script:
-                st.error("Script generation failed.")
-                st.stop()
-            # st.json(script) # Debug only
+            params = {"news_item": news_item, "use_pexels": bool(use_pexels and pexels_key_input), "backend": render_backend, "motion": image_motion, "profile": encoder_profile}
+            if mode == "Trending News" and 'news_data' in st.session_state:
+                params["ingestion_timing"] = st.session_state.get('ingestion_timing', [])
+            secrets = {"GEMINI_API_KEY": api_key_input, "GROQ_API_KEY": groq_key_input, "PEXELS_API_KEY": pexels_key_input}
+            st.session_state['job_id'] = job_service.submit(params, secrets)
+
+    job = job_service.get(st.session_state['job_id']) if 'job_id' in st.session_state else None
+    if job:
+        st.caption(f"Job {job['id']} · {job['status']}")
+        if job['status'] in jobs.ACTIVE:
+            st.progress(job['progress'])
+            st.text(job['message'] or "")
+            if st.button("Cancel"):
+                job_service.cancel(job['id'])
+            # Poll: the render runs in a worker process, this rerun only reads its row
+            time.sleep(1)
+            st.rerun()
+        elif job['status'] == "done":
+            result = job['result']
+            st.success("Video Generated!")
+            st.video(result['output'])
             with st.expander("View Generated Script (Details)"):
-                st.json(script)
-
-            with open(os.path.join(DATA_DIR, "script.json"), "w") as f:
-                json.dump([script], f)
-            progress_bar.progress(30)
-            
-            # 3. Assets
-            status_text.text("Generating Assets...")
-            segments = script.get("segments", [])
-            total_segs = len(segments)
-            for i, seg in enumerate(segments):
-                # Audio
-                assets.generate_audio(seg['text'], os.path.join(ASSETS_DIR, f"{i}_audio.mp3"))
-                
-                # Visuals
-                visual_done = False
-                if use_pexels and pexels_key_input:
-                    # Try Video first
-                    status_text.text(f"Searching Pexels for: {seg['image_prompt']}...")
-                    visual_done = assets.search_pexels_video(seg['image_prompt'], os.path.join(ASSETS_DIR, f"{i}_visual.mp4"), pexels_key_input)
-                
-                if not visual_done:
-                    # Fallback Image
-                    assets.generate_image(seg['image_prompt'], os.path.join(ASSETS_DIR, f"{i}_visual.jpg"))
-                
-                # Prog update
-                current_prog = 30 + int((i+1)/total_segs * 40)
-                progress_bar.progress(current_prog)
-                
-            # 4. Video
-            status_text.text("Rendering Video (MoviePy)...")
-            output_video = "final_output.mp4"
-            success = video.make_video(script, ASSETS_DIR, output_video)
-            progress_bar.progress(100)
-            
-            if success:
-                st.success("Video Generated!")
-                st.video(output_video)
-                
-                # Report
-                report = f"""# Video Generation Report
-**Topic**: {news_item['title']}
-**Segments**: {len(segments)}
-**Music Mood**: {script.get('music_mood', 'N/A')}
-
-## Script
-"""
-                for seg in segments:
-                    report += f"- {seg['text']} (Visual: {seg['image_prompt']})\n"
-                
-                with open(os.path.join(REPORTS_DIR, "report.md"), "w") as f:
-                    f.write(report)
-                
-                st.download_button("Download Report", report, "report.md")
-            else:
-                st.error("Video rendering failed.")
+                st.json(result['script'])
+            with st.expander("Timing Breakdown"):
+                st.table(result['timing'])
+                if result.get('script_cache'):
+                    sc = result['script_cache']
+                    st.caption(f"Script cache: {sc['hits']} hits / {sc['misses']} misses, {sc['coalesced']} coalesced")
+                if result.get('asset_cache'):
+                    ac = result['asset_cache']
+                    st.caption(f"Asset cache: {ac['hits']} hits / {ac['misses']} misses, {ac['entries']} entries, {ac['bytes'] / 1024 / 1024:.1f} MB, {ac['evictions']} evicted")
+                if result.get('encode'):
+                    enc = result['encode']
+                    st.caption(f"Encoded with the {enc['profile']} profile at {enc['encode_fps']} fps, {(enc['output_bytes'] or 0) / 1024 / 1024:.1f} MB")
+                    st.table([{"profile": name, **stats} for name, stats in job_service.profile_stats().items()])
+            with open(result['report']) as f:
+                st.download_button("Download Report", f.read(), "report.md")
+        elif job['status'] == "failed":
+            st.error(job['error'] or "Video generation failed.")
+        else:
+            st.warning("Job cancelled.")
@@ -0,0 +1,147 @@
+import os
+import json
+import asyncio
+import threading
+import http.server
+from urllib.parse import urlsplit
+
+import numpy as np
+from PIL import Image
+
+from src import ffmpeg
+
+# Synthetic, offline stand-ins for everything the pipeline normally fetches
+CANNED_SCRIPT = {
+    "music_mood": "Upbeat electronic",
+    "segments": [
+        {"text": "Researchers unveiled a chip that runs language models on a phone.", "image_prompt": "Cinematic macro shot of a glowing chip"},
+        {"text": "It cuts power draw by ninety percent compared to last year's parts.", "image_prompt": "Battery meter climbing in neon light"},
+        {"text": "Developers can already try it through an open toolkit.", "image_prompt": "Programmer at night surrounded by screens"},
+        {"text": "Analysts expect the first devices before the end of the year.", "image_prompt": "Smartphone on a pedestal under spotlights"},
+        {"text": "The race for on-device AI just got a lot more interesting.", "image_prompt": "Runners on a track made of circuit traces"},
+    ],
+}
+
+def canned_script(segments=5):
+    base = CANNED_SCRIPT["segments"]
+    return {
+        "music_mood": CANNED_SCRIPT["music_mood"],
+        "segments": [dict(base[i % len(base)], text=f"{base[i % len(base)]['text']} ({i})") for i in range(segments)],
+    }
+
+def make_audio(path, seconds=3.0, frequency=440):
+    ffmpeg.run(["-f", "lavfi", "-i", f"sine=frequency={frequency}:duration={seconds}", "-ac", "1", "-ar", "24000", "-b:a", "48k", path])
+
+def make_music(path, seconds=20.0):
+    # A tone over noise, so ducking has something broadband to work on
+    ffmpeg.run([
+        "-f", "lavfi", "-i", f"sine=frequency=220:duration={seconds}", "-f", "lavfi", "-i", f"anoisesrc=d={seconds}:a=0.2",
+        "-filter_complex", "amix=inputs=2", "-ac", "2", "-b:a", "128k", path,
+    ])
+
+def make_image(path, width=1080, height=1920):
+    pattern = np.zeros((height, width, 3), np.uint8)
+    pattern[..., 0] = np.linspace(0, 255, width, dtype=np.uint8)[None, :]
+    pattern[..., 1] = 96
+    pattern[..., 2] = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+    Image.fromarray(pattern).save(path, quality=90)
+
+def make_video(path, seconds=4, width=1080, height=1920, rate=25):
+    ffmpeg.run(["-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={rate}:duration={seconds}", "-pix_fmt", "yuv420p", "-c:v", "libx264", "-preset", "ultrafast", path])
+
+def make_assets(assets_dir, segments=5, seconds=3.0, images_only=False):
+    """
+    Lays out {i}_audio.mp3 plus {i}_visual.mp4 / {i}_visual.jpg (alternating, or only stills) like the asset stage does.
+    Source media is generated once and copied, so fixtures are cheap for long scripts.
+    """
+    os.makedirs(assets_dir, exist_ok=True)
+    audio_src = os.path.join(assets_dir, "_src_audio.mp3")
+    image_src = os.path.join(assets_dir, "_src_visual.jpg")
+    video_src = os.path.join(assets_dir, "_src_visual.mp4")
+    make_audio(audio_src, seconds)
+    make_image(image_src)
+    make_video(video_src, seconds=max(2, int(seconds) - 1))
+
+    for i in range(segments):
+        _copy(audio_src, os.path.join(assets_dir, f"{i}_audio.mp3"))
+        if i % 2 == 0 and not images_only:
+            _copy(video_src, os.path.join(assets_dir, f"{i}_visual.mp4"))
+        else:
+            _copy(image_src, os.path.join(assets_dir, f"{i}_visual.jpg"))
+    return canned_script(segments)
+
+def _copy(src, dst):
+    with open(src, "rb") as f_in, open(dst, "wb") as f_out:
+        f_out.write(f_in.read())
+
+class FakeCommunicate:
+    """Offline edge_tts.Communicate: streams a fixture MP3 instead of calling the TTS service."""
+    audio_bytes = b""
+    latency = 0.0
+
+    def __init__(self, text, voice):
+        self.text = text
+
+    async def stream(self):
+        await asyncio.sleep(self.latency)
+        yield {"type": "audio", "data": self.audio_bytes}
+
+class StubServers:
+    """
+    One local HTTP server answering for Pexels search/download, Pollinations and Groq,
+    with an optional per-request delay to mimic network latency.
+    """
+
+    def __init__(self, fixtures_dir, latency=0.0):
+        self.latency = latency
+        self.files = {
+            "video": open(os.path.join(fixtures_dir, "_src_visual.mp4"), "rb").read(),
+            "image": open(os.path.join(fixtures_dir, "_src_visual.jpg"), "rb").read(),
+        }
+        self.llm_response = json.dumps({"choices": [{"message": {"content": json.dumps(CANNED_SCRIPT)}}]}).encode()
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, body, content_type):
+                if stub.latency:
+                    threading.Event().wait(stub.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                if path.startswith("/videos/search"):
+                    files = [{"file_type": "video/mp4", "width": 1080, "height": 1920, "link": f"{stub.url}/files/clip.mp4"}]
+                    self._send(json.dumps({"videos": [{"video_files": files}]}).encode(), "application/json")
+                elif path.startswith("/files/"):
+                    self._send(stub.files["video"], "video/mp4")
+                elif path.startswith("/prompt/"):
+                    self._send(stub.files["image"], "image/jpeg")
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self._send(stub.llm_response, "application/json")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,360 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import tempfile
+import tracemalloc
+
+from src import assets, audio, cache, metrics, synthesis, video
+from benchmarks import fixtures
+
+# Offline benchmark for the asset and render pipeline. Run from the repo root:
+#   python -m benchmarks.run [--quick] [--save-baseline] [--only render]
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold import budget per entry point (seconds, cumulative per `python -X importtime`).
+# These modules must not pull in the heavy stage dependencies until a stage runs.
+IMPORT_BUDGETS = {
+    "src.jobs": 0.5,
+    "src.batch": 0.5,
+    "src.ingestion": 0.4,
+    "src.video": 0.4,
+}
+# Peak RSS (render process + its ffmpeg children) per script length. The streaming backend must
+# stay under the ceiling however long the script gets.
+MEMORY_SEGMENTS = (7, 30, 100)
+RSS_CEILING_MB = {"streaming": 450}
+
+HEAVY_MODULES = ("moviepy", "google.generativeai", "trafilatura", "feedparser", "edge_tts", "numpy", "PIL")
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+def bench(name, func, repeats, setup=None, units=1, unit="ops"):
+    """
+    Times func() `repeats` times (setup() runs untimed before each) and reports latency, throughput and memory.
+    Python heap peak comes from one traced warm-up run, so tracemalloc overhead stays out of the timings.
+    """
+    def traced():
+        tracemalloc.start()
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak
+
+    samples = []
+    if setup:
+        setup()
+    elapsed, py_peak = traced()
+    if repeats == 1:
+        samples.append(elapsed) # Too slow to run twice; accept the tracing overhead
+    for _ in range(repeats if repeats > 1 else 0):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    mean = sum(samples) / len(samples)
+    return {
+        "name": name,
+        "repeats": repeats,
+        "p50_s": round(percentile(samples, 0.50), 4),
+        "p95_s": round(percentile(samples, 0.95), 4),
+        "p99_s": round(percentile(samples, 0.99), 4),
+        "mean_s": round(mean, 4),
+        "throughput": round(units / mean, 2) if mean else None,
+        "unit": f"{unit}/s",
+        "py_peak_mb": round(py_peak / 1024 / 1024, 1),
+        "rss_peak_mb": metrics.peak_rss_mb(),
+        "children_rss_peak_mb": metrics.peak_rss_mb("children"),
+    }
+
+def timeline_frames(assets_dir, script):
+    """Frames in the rendered video: every segment's voiceover plus its padding, the units for render throughput."""
+    return sum(assets.get_audio_duration(os.path.join(assets_dir, f"{i}_audio.mp3")) + video.PADDING for i in range(len(script["segments"]))) * video.FPS
+
+def bench_captions(workdir, repeats):
+    image = os.path.join(workdir, "_src_visual.jpg")
+    output = os.path.join(workdir, "caption_out.jpg")
+    counter = iter(range(10 ** 9))
+    # A new caption each time, so the overlay memo does not hide the drawing cost
+    run = lambda: video.create_image_with_text(image, f"Benchmark caption number {next(counter)} with a few extra words", output)
+    return [bench("create_image_with_text", run, repeats, unit="images")]
+
+def bench_render(workdir, script, repeats, backends):
+    frames = timeline_frames(workdir, script)
+    segments_dir = os.path.join(workdir, "segments")
+    output = os.path.join(workdir, "render_out.mp4")
+    results = []
+    for backend in backends:
+        n = 1 if backend == "moviepy" else repeats
+        clear = lambda: shutil.rmtree(segments_dir, ignore_errors=True)
+        run = lambda: video.make_video(script, workdir, output, backend=backend)
+        results.append(bench(f"make_video[{backend}]", run, n, setup=clear, units=frames, unit="frames"))
+        if backend == "parallel":
+            results.append(bench("make_video[parallel, unchanged]", run, repeats, units=frames, unit="frames"))
+    return results
+
+def bench_profiles(workdir, script, repeats, backend="ffmpeg"):
+    # CPU against bandwidth: encode throughput and file size for each encoder profile
+    frames = timeline_frames(workdir, script)
+    output = os.path.join(workdir, "profile_out.mp4")
+    results = []
+    for profile in video.ENCODER_PROFILES:
+        run = lambda: video.make_video(script, workdir, output, backend=backend, profile=profile)
+        result = bench(f"make_video[{backend}, {profile}]", run, repeats, units=frames, unit="frames")
+        result["output_mb"] = round(os.path.getsize(output) / 1024 / 1024, 2)
+        results.append(result)
+    return results
+
+def bench_renditions(workdir, script, repeats, backends, profiles=("archive", "standard", "preview")):
+    # One composite fanned out to every rendition, against the largest alone and against separate renders
+    frames = timeline_frames(workdir, script)
+    outputs = [{"path": os.path.join(workdir, f"rendition_{p}.mp4"), "profile": p} for p in profiles]
+    segments_dir = os.path.join(workdir, "segments")
+    clear = lambda: shutil.rmtree(segments_dir, ignore_errors=True)
+    results = []
+    for backend in backends:
+        n = 1 if backend == "moviepy" else repeats
+        render = lambda specs: video.make_video(script, workdir, specs, backend=backend)
+        results.append(bench(f"make_video[{backend}, {profiles[0]} only]", lambda: render(outputs[:1]), n, setup=clear, units=frames, unit="frames"))
+        results.append(bench(f"make_video[{backend}, {len(outputs)} renditions]", lambda: render(outputs), n, setup=clear, units=frames, unit="frames"))
+        separate = lambda: [clear() or render([spec]) for spec in outputs]
+        results.append(bench(f"make_video[{backend}, {len(outputs)} separate]", separate, n, setup=clear, units=frames, unit="frames"))
+    return results
+
+def bench_audio(workdir, script, repeats):
+    # The audio stage on its own, cold and cached, with and without a music bed
+    music_dir = os.path.join(workdir, "music", "upbeat")
+    os.makedirs(music_dir, exist_ok=True)
+    fixtures.make_music(os.path.join(music_dir, "electronic.mp3"))
+    voiceovers = []
+    for i in range(len(script["segments"])):
+        path = os.path.join(workdir, f"{i}_audio.mp3")
+        voiceovers.append((path, video._segment_duration(assets.get_audio_duration(path))))
+    seconds = sum(d for _, d in voiceovers)
+    clear = lambda: shutil.rmtree(os.path.join(workdir, audio.TRACKS_DIR), ignore_errors=True)
+    previous, audio.MUSIC_DIR = audio.MUSIC_DIR, os.path.dirname(music_dir)
+    try:
+        results = []
+        for mood in (None, script["music_mood"]):
+            label = "bed" if mood else "voice only"
+            run = lambda: audio.build_track(voiceovers, workdir, mood)
+            results.append(bench(f"audio.build_track[{label}]", run, repeats, setup=clear, units=seconds, unit="audio s"))
+            results.append(bench(f"audio.build_track[{label}, cached]", run, repeats, units=seconds, unit="audio s"))
+    finally:
+        audio.MUSIC_DIR = previous
+        clear()
+    return results
+
+def bench_motion(workdir, segments, repeats, backends):
+    # Still-image segments only; each preset should cost about what the static still does
+    motion_dir = os.path.join(workdir, "motion")
+    script = fixtures.make_assets(motion_dir, segments, images_only=True)
+    frames = timeline_frames(motion_dir, script)
+    output = os.path.join(motion_dir, "motion_out.mp4")
+    results = []
+    for backend in backends:
+        for preset in video.MOTION_PRESETS:
+            run = lambda: video.make_video(script, motion_dir, output, backend=backend, motion=preset)
+            results.append(bench(f"make_video[{backend}, {preset}]", run, repeats, units=frames, unit="frames"))
+    return results
+
+def bench_assets(workdir, script, repeats, stub_latency):
+    fixtures.FakeCommunicate.audio_bytes = open(os.path.join(workdir, "_src_audio.mp3"), "rb").read()
+    fixtures.FakeCommunicate.latency = stub_latency
+    segments = script["segments"]
+    out_dir = os.path.join(workdir, "asset_out")
+    cache_dir = os.path.join(workdir, "asset_cache")
+    # Later benchmarks in the same run (and callers importing this module) get the real providers back
+    previous = (assets.edge_tts.Communicate, assets.PEXELS_API_URL, assets.POLLINATIONS_URL, synthesis.GROQ_API_URL, cache._default_cache)
+    assets.edge_tts.Communicate = fixtures.FakeCommunicate
+
+    try:
+        with fixtures.StubServers(workdir, latency=stub_latency) as stub:
+            assets.PEXELS_API_URL = stub.url
+            assets.POLLINATIONS_URL = stub.url
+            synthesis.GROQ_API_URL = f"{stub.url}/openai/v1/chat/completions"
+
+            def cold_cache():
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                cache.set_cache(cache.AssetCache(cache_dir))
+
+            run = lambda: assets.generate_assets(segments, out_dir, pexels_key="bench")
+            news = {"title": "Benchmark", "content": "Offline benchmark article. " * 50}
+            return [
+                bench("generate_assets[cold]", run, repeats, setup=cold_cache, units=len(segments), unit="segments"),
+                bench("generate_assets[cached]", run, repeats, units=len(segments), unit="segments"),
+                bench("generate_script_groq[stub]", lambda: synthesis.generate_script_groq(news, "bench"), repeats, unit="scripts"),
+            ]
+    finally:
+        assets.edge_tts.Communicate, assets.PEXELS_API_URL, assets.POLLINATIONS_URL, synthesis.GROQ_API_URL, previous_cache = previous
+        cache.set_cache(previous_cache)
+
+def import_time(module):
+    """Cold import time of module in a fresh interpreter, plus the heavy modules it dragged in."""
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, cwd=REPO_ROOT)
+    seconds = None
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            seconds = int(parts[1]) / 1e6
+    heavy = [m for m in result.stdout.strip().split(",") if m]
+    return seconds, heavy
+
+def bench_imports(repeats):
+    results = []
+    for module, budget in IMPORT_BUDGETS.items():
+        samples, heavy = [], []
+        for _ in range(repeats):
+            seconds, heavy = import_time(module)
+            samples.append(seconds)
+        p50 = percentile(samples, 0.50)
+        results.append({
+            "name": f"import[{module}]",
+            "repeats": repeats,
+            "p50_s": round(p50, 4),
+            "p95_s": round(percentile(samples, 0.95), 4),
+            "p99_s": round(percentile(samples, 0.99), 4),
+            "mean_s": round(sum(samples) / len(samples), 4),
+            "budget_s": budget,
+            "heavy": heavy,
+            "over_budget": p50 > budget or bool(heavy),
+        })
+    return results
+
+RENDER_RSS = """
+import json, sys, resource
+from src import video
+script, assets_dir, output, backend = json.loads(sys.argv[1])
+ok = video.make_video(script, assets_dir, output, backend=backend)
+usage = lambda who: resource.getrusage(who).ru_maxrss / 1024
+print(json.dumps({"ok": ok, "self_mb": usage(resource.RUSAGE_SELF), "children_mb": usage(resource.RUSAGE_CHILDREN)}))
+"""
+
+def render_rss(script, assets_dir, backend):
+    """Renders in a fresh interpreter so ru_maxrss is this render's peak, not the benchmark's."""
+    output = os.path.join(assets_dir, f"rss_{backend}.mp4")
+    args = json.dumps([script, assets_dir, output, backend])
+    result = subprocess.run([sys.executable, "-c", RENDER_RSS, args], capture_output=True, text=True, cwd=REPO_ROOT)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def bench_memory(segment_counts, backends):
+    results = []
+    for n in segment_counts:
+        with tempfile.TemporaryDirectory() as workdir:
+            # Short segments: the point is the number of readers and clips alive at once
+            script = fixtures.make_assets(workdir, n, seconds=1.0)
+            for backend in backends:
+                started = time.perf_counter()
+                usage = render_rss(script, workdir, backend)
+                elapsed = time.perf_counter() - started
+                ceiling = RSS_CEILING_MB.get(backend)
+                results.append({
+                    "name": f"peak_rss[{backend}, {n} segments]",
+                    "repeats": 1,
+                    "p50_s": round(elapsed, 4),
+                    "p95_s": round(elapsed, 4),
+                    "p99_s": round(elapsed, 4),
+                    "mean_s": round(elapsed, 4),
+                    "rss_peak_mb": round(usage["self_mb"], 1),
+                    "children_rss_peak_mb": round(usage["children_mb"], 1),
+                    "budget_mb": ceiling,
+                    "over_budget": not usage["ok"] or (ceiling is not None and usage["self_mb"] > ceiling),
+                })
+    return results
+
+def compare(results, baseline, tolerance):
+    """Returns the names whose p50 regressed by more than `tolerance` against the baseline."""
+    regressions = []
+    for r in results:
+        base = baseline.get(r["name"])
+        if not base:
+            r["vs_baseline"] = "new"
+            continue
+        ratio = r["p50_s"] / base["p50_s"] if base["p50_s"] else 1.0
+        r["vs_baseline"] = f"{ratio:.2f}x"
+        if ratio > 1 + tolerance:
+            regressions.append(r["name"])
+    return regressions
+
+def print_table(results):
+    cols = ["name", "repeats", "p50_s", "p95_s", "p99_s", "throughput", "unit", "py_peak_mb", "rss_peak_mb", "output_mb", "vs_baseline"]
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in results)) for c in cols}
+    print("  ".join(c.ljust(widths[c]) for c in cols))
+    for r in results:
+        print("  ".join(str(r.get(c, "")).ljust(widths[c]) for c in cols))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark for the asset and render pipeline.")
+    parser.add_argument("--quick", action="store_true", help="fewer segments and repeats")
+    parser.add_argument("--segments", type=int, default=None)
+    parser.add_argument("--repeats", type=int, default=None)
+    parser.add_argument("--only", choices=["imports", "captions", "render", "assets", "memory"], action="append")
+    parser.add_argument("--memory-backends", default="streaming,moviepy")
+    parser.add_argument("--backends", default=",".join(video.RENDER_BACKENDS))
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="seconds added to every stubbed network call")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before flagging a regression")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    segments = args.segments or (3 if args.quick else 7)
+    repeats = args.repeats or (2 if args.quick else 5)
+    groups = args.only or ["imports", "captions", "render", "assets"]
+
+    results = []
+    if "imports" in groups:
+        results += bench_imports(repeats)
+    with tempfile.TemporaryDirectory() as workdir:
+        script = fixtures.make_assets(workdir, segments)
+        if "captions" in groups:
+            results += bench_captions(workdir, repeats * 4)
+        if "render" in groups:
+            results += bench_render(workdir, script, repeats, args.backends.split(","))
+            results += bench_profiles(workdir, script, repeats)
+            results += bench_audio(workdir, script, repeats)
+            results += bench_renditions(workdir, script, repeats, [b for b in args.backends.split(",") if b in ("streaming", "ffmpeg")])
+            results += bench_motion(workdir, segments, repeats, [b for b in args.backends.split(",") if b in ("streaming", "ffmpeg")])
+        if "assets" in groups:
+            results += bench_assets(workdir, script, repeats, args.stub_latency)
+    if "memory" in groups:
+        results += bench_memory(MEMORY_SEGMENTS[:2] if args.quick else MEMORY_SEGMENTS, args.memory_backends.split(","))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = {r["name"]: r for r in json.load(f)["results"]}
+    regressions = compare(results, baseline, args.tolerance)
+    over_budget = [r for r in results if r.get("over_budget")]
+    print_table(results)
+    for r in over_budget:
+        if "budget_mb" in r:
+            print(f"MEMORY CEILING: {r['name']} peaked at {r['rss_peak_mb']} MB (ceiling {r['budget_mb']} MB) or failed")
+        else:
+            print(f"IMPORT BUDGET: {r['name']} took {r['p50_s']}s (budget {r['budget_s']}s), heavy modules loaded: {r['heavy'] or 'none'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"segments": segments, "results": results}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if regressions:
+        print(f"REGRESSION (> {args.tolerance:.0%} slower than baseline): {', '.join(regressions)}")
+    return 1 if regressions or over_budget else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
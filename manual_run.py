@@ -1,5 +1,5 @@
 
-from src import ingestion, synthesis, assets, video
+from src import ingestion, synthesis, assets, video, metrics
 import os
 import json
 
@@ -36,9 +36,15 @@ try:
 except:
     print("Fetch failed, using mock.")
 
-# 2. Synthesis
-print("Synthesizing script...")
-script = synthesis.generate_script(news_item, gemini_key=api_key, groq_key=groq_key)
+# 2. Synthesis + 3. Assets: each segment's assets start as soon as the LLM finishes writing it
+print("Synthesizing script and generating assets...")
+assets_dir = "assets"
+
+def on_asset_progress(done, total, message):
+    print(f"[{done}/{total}] {message}")
+
+stream = assets.AssetStream(assets_dir, pexels_key=pexels_key, progress_callback=on_asset_progress)
+script = synthesis.generate_script_stream(news_item, gemini_key=api_key, groq_key=groq_key, on_segment=stream.submit)
 if not script:
     # Fallback script
     script = {
@@ -51,32 +57,19 @@ if not script:
         ]
     }
     print("Using Fallback script.")
+    for i, seg in enumerate(script["segments"]):
+        stream.submit(i, seg)
 
 with open("data/manual_script.json", "w") as f:
     json.dump([script], f)
 
-# 3. Assets
-print("Generating Assets...")
-segments = script.get("segments", [])
-assets_dir = "assets"
-os.makedirs(assets_dir, exist_ok=True)
-
-for i, seg in enumerate(segments):
-    assets.generate_audio(seg['text'], os.path.join(assets_dir, f"{i}_audio.mp3"))
-    
-    # Visuals: Try Video, then Image
-    done = False
-    if pexels_key:
-        print(f"Searching Pexels for {seg['image_prompt']}...")
-        done = assets.search_pexels_video(seg['image_prompt'], os.path.join(assets_dir, f"{i}_visual.mp4"), pexels_key)
-    
-    if not done:
-        print("Fallback to Image Gen...")
-        assets.generate_image(seg['image_prompt'], os.path.join(assets_dir, f"{i}_visual.jpg"))
-        
-    print(f"Segment {i} assets done.")
+stream.close()
 
 # 4. Video
 print("Rendering Video...")
 video.make_video(script, assets_dir, "tool_generated_video.mp4")
+
+os.makedirs("reports", exist_ok=True)
+metrics.recorder.export_chrome_trace("reports/manual_trace.json")
+print(metrics.recorder.summary_markdown())
 print("Done!")
@@ -1,81 +1,386 @@
-
 import os
-import requests
-import edge_tts
+import queue
+import threading
+import weakref
 import asyncio
-from mutagen.mp3 import MP3
+from . import ffmpeg, lazy, metrics, net
+from .cache import get_cache
 
-async def _generate_audio_async(text, output_file, voice="en-US-GuyNeural"):
-    communicate = edge_tts.Communicate(text, voice)
-    await communicate.save(output_file)
+edge_tts = lazy.module("edge_tts")
+mutagen_mp3 = lazy.module("mutagen.mp3")
 
-def generate_audio(text, output_file):
-    try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(_generate_audio_async(text, output_file))
-        loop.close()
+DEFAULT_VOICE = "en-US-GuyNeural"
+
+# Provider endpoints (overridable, e.g. by the offline benchmark's stub servers)
+POLLINATIONS_URL = "https://image.pollinations.ai"
+PEXELS_API_URL = "https://api.pexels.com"
+
+# Per-provider concurrency limits for the asset scheduler
+PROVIDER_LIMITS = {
+    "edge-tts": 4,
+    "pexels": 2,
+    "pollinations": 2,
+}
+
+# Stock footage downloads
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_DOWNLOAD_BYTES = 100 * 1024 * 1024
+
+# One long-lived event loop shared by every sync entry point, instead of a new loop per call
+_loop = None
+_loop_lock = threading.Lock()
+_limits_by_loop = weakref.WeakKeyDictionary()
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="assets-loop", daemon=True).start()
+    return _loop
+
+def _run(coro, events=None, callback=None):
+    """
+    Runs coro on the shared loop and blocks until it finishes. Events put on the
+    `events` queue are delivered to callback in the calling thread (e.g. Streamlit's).
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_loop())
+    if events is not None:
+        while True:
+            try:
+                callback(*events.get(timeout=0.1))
+            except queue.Empty:
+                if future.done():
+                    break
+    return future.result()
+
+def _provider_limits():
+    # Semaphores belong to a loop, so keep one set per loop
+    loop = asyncio.get_running_loop()
+    if loop not in _limits_by_loop:
+        _limits_by_loop[loop] = {name: asyncio.Semaphore(n) for name, n in PROVIDER_LIMITS.items()}
+    return _limits_by_loop[loop]
+
+async def _tts(text, output_file, voice=DEFAULT_VOICE):
+    cache = get_cache()
+    key = cache.key("edge-tts", voice, text)
+    if cache.fetch(key, ".mp3", output_file):
         return True
-    except Exception as e:
-        print(f"TTS Error: {e}")
-        return False
+
+    async with _provider_limits()["edge-tts"]:
+        try:
+            with metrics.span("tts", voice=voice, chars=len(text)) as span:
+                communicate = edge_tts.Communicate(text, voice)
+                tmp_file = output_file + ".part"
+                with open(tmp_file, "wb") as f:
+                    async for chunk in communicate.stream():
+                        if chunk["type"] == "audio":
+                            f.write(chunk["data"])
+                            span.add_bytes(len(chunk["data"]))
+            os.replace(tmp_file, output_file)
+            cache.store(key, ".mp3", output_file)
+            return True
+        except Exception as e:
+            print(f"TTS Error: {e}")
+            return False
+
+async def generate_audio_many(items, voice=DEFAULT_VOICE):
+    """
+    Synthesizes several (text, output_file) pairs at once. Returns a list of success flags.
+    """
+    return await asyncio.gather(*(_tts(text, output_file, voice) for text, output_file in items))
+
+def generate_audio(text, output_file, voice=DEFAULT_VOICE):
+    return _run(generate_audio_many([(text, output_file)], voice))[0]
 
 def get_audio_duration(file_path):
     try:
-        audio = MP3(file_path)
+        audio = mutagen_mp3.MP3(file_path)
         return audio.info.length
     except:
         return 0
 
+def cache_stats():
+    return get_cache().stats()
+
 def generate_image(prompt, output_file):
     # Pollinations.ai simple GET request
     # Enforce vertical 9:16 aspect ratio (1080x1920)
-    url = f"https://image.pollinations.ai/prompt/{prompt}?width=1080&height=1920&nologo=true"
+    cache = get_cache()
+    key = cache.key("pollinations", prompt, 1080, 1920)
+    if cache.fetch(key, ".jpg", output_file):
+        return True
+
+    url = f"{POLLINATIONS_URL}/prompt/{prompt}?width=1080&height=1920&nologo=true"
     try:
-        response = requests.get(url, timeout=30)
+        response = net.get(url, timeout=(5, 30))
         if response.status_code == 200:
-            with open(output_file, 'wb') as f:
+            tmp_file = output_file + ".part"
+            with open(tmp_file, 'wb') as f:
                 f.write(response.content)
+            os.replace(tmp_file, output_file)
+            cache.store(key, ".jpg", output_file)
             return True
     except Exception as e:
         print(f"Image Gen Error: {e}")
     return False
 
-def search_pexels_video(query, output_file, api_key):
+def select_rendition(video_files, target_w=720, target_h=1280):
+    """
+    Smallest MP4 rendition that still covers target_w x target_h, so make_video only ever
+    scales down. Falls back to the largest MP4 when none covers the frame.
+    """
+    mp4s = [v for v in video_files if v.get("file_type") == "video/mp4" and v.get("width") and v.get("height")]
+    if not mp4s:
+        return video_files[0] if video_files else None
+    covering = [v for v in mp4s if v["width"] >= target_w and v["height"] >= target_h]
+    if covering:
+        return min(covering, key=lambda v: v["width"] * v["height"])
+    return max(mp4s, key=lambda v: v["width"] * v["height"])
+
+def download_file(url, output_file, max_bytes=MAX_DOWNLOAD_BYTES, attempts=3):
+    """
+    Streams url to output_file in large chunks, refusing anything over max_bytes.
+    A dropped connection resumes from the partial file with a Range request.
+    """
+    part_file = output_file + ".part"
+    url_file = part_file + ".url" # which URL the partial file holds
+    if os.path.exists(part_file):
+        try:
+            with open(url_file, encoding="utf-8") as f:
+                resumable = f.read() == url
+        except OSError:
+            resumable = False
+        if not resumable:
+            os.remove(part_file) # Bytes of a different clip for this path
+    with open(url_file, "w", encoding="utf-8") as f:
+        f.write(url)
+
+    def discard():
+        for path in (part_file, url_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    for attempt in range(attempts):
+        offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with net.get(url, headers=headers, stream=True, timeout=(5, 30)) as response:
+                if offset and response.status_code == 416:
+                    break # Partial file already holds the whole body
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    offset = 0 # Server ignored the Range header, start over
+
+                length = response.headers.get("Content-Length")
+                if length and offset + int(length) > max_bytes:
+                    raise ValueError(f"{offset + int(length)} bytes exceeds the {max_bytes} byte cap")
+
+                written = offset
+                with open(part_file, "ab" if offset else "wb") as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        written += len(chunk)
+                        metrics.add_bytes(len(chunk))
+                        if written > max_bytes:
+                            raise ValueError(f"Download exceeds the {max_bytes} byte cap")
+                        f.write(chunk)
+            break
+        except ValueError:
+            discard()
+            raise
+        except Exception as e:
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            # A 4xx will not go away on retry
+            if attempt == attempts - 1 or (status and 400 <= status < 500):
+                discard()
+                raise
+            print(f"Download interrupted ({e}), resuming...")
+    os.replace(part_file, output_file)
+    os.remove(url_file)
+    return True
+
+def _trim_video(path, max_seconds):
+    # Keyframe-accurate stream copy: cheap, and the renderer loops/cuts to exact length anyway
+    if ffmpeg.probe_duration(path) <= max_seconds + 1:
+        return
+    tmp_file = path + ".trim.mp4"
+    ffmpeg.run(["-i", path, "-t", f"{max_seconds:.3f}", "-c", "copy", "-movflags", "+faststart", tmp_file])
+    os.replace(tmp_file, path)
+
+def search_pexels_video(query, output_file, api_key, target_w=720, target_h=1280, max_seconds=None):
     if not api_key:
         return False
+
+    cache = get_cache()
+    key = cache.key("pexels", query, "portrait", "medium", target_w, target_h, max_seconds)
+    if cache.fetch(key, ".mp4", output_file):
+        return True
         
     headers = {"Authorization": api_key}
     # Search for vertical videos (portrait)
-    url = f"https://api.pexels.com/videos/search?query={query}&orientation=portrait&per_page=1&size=medium"
+    url = f"{PEXELS_API_URL}/videos/search?query={query}&orientation=portrait&per_page=1&size=medium"
     
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = net.get(url, headers=headers, timeout=10)
         data = response.json()
         
         if data.get("videos"):
-            video_files = data["videos"][0]["video_files"]
-            # specific logic to find best quality MP4 compatible with moviepy
-            # usually the one with width <= 1080 to save bandwidth but good quality
-            best_video = None
-            for v in video_files:
-                if v["file_type"] == "video/mp4" and v["width"] <= 1080:
-                    best_video = v
-                    break
-            
+            best_video = select_rendition(data["videos"][0]["video_files"], target_w, target_h)
             if not best_video:
-                 best_video = video_files[0] # Fallback
-            
-            # Download
-            link = best_video["link"]
-            v_response = requests.get(link, stream=True)
-            with open(output_file, 'wb') as f:
-                for chunk in v_response.iter_content(chunk_size=1024):
-                    if chunk:
-                        f.write(chunk)
+                return False
+
+            download_file(best_video["link"], output_file)
+            if max_seconds:
+                _trim_video(output_file, max_seconds)
+            cache.store(key, ".mp4", output_file)
             return True
             
     except Exception as e:
         print(f"Pexels Error: {e}")
         
     return False
+
+async def _skip():
+    return None
+
+def _traced(name, func, *args):
+    with metrics.span(name) as span:
+        result = func(*args)
+        span.set(ok=bool(result))
+        return result
+
+async def _generate_segment_assets(i, seg, assets_dir, pexels_key, report, parts=("audio", "visual")):
+    audio_path = os.path.join(assets_dir, f"{i}_audio.mp3")
+    video_path = os.path.join(assets_dir, f"{i}_visual.mp4")
+    image_path = os.path.join(assets_dir, f"{i}_visual.jpg")
+
+    async def audio_job():
+        ok = await _tts(seg['text'], audio_path)
+        report(i, "audio", ok)
+        return ok
+
+    async def visual_job():
+        # Drop visuals from a previous run so make_video doesn't pick a stale clip
+        for stale in (video_path, image_path):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+        # Same fallback order as before: Pexels video, then Pollinations image
+        if pexels_key:
+            async with _provider_limits()["pexels"]:
+                done = await asyncio.to_thread(_traced, "pexels", search_pexels_video, seg['image_prompt'], video_path, pexels_key)
+            if done:
+                report(i, "video", True)
+                return "video"
+        async with _provider_limits()["pollinations"]:
+            done = await asyncio.to_thread(_traced, "pollinations", generate_image, seg['image_prompt'], image_path)
+        report(i, "image", done)
+        return "image" if done else None
+
+    with metrics.span("segment", index=i) as span:
+        has_audio, visual = await asyncio.gather(
+            audio_job() if "audio" in parts else _skip(),
+            visual_job() if "visual" in parts else _skip(),
+        )
+        span.set(audio=has_audio, visual=visual)
+    return {"audio": has_audio, "visual": visual}
+
+async def generate_assets_async(segments, assets_dir, pexels_key=None, progress_callback=None, plan=None):
+    """
+    Runs audio and visual jobs for every segment concurrently, bounded per provider
+    by PROVIDER_LIMITS. progress_callback(done, total, message) is called as each job finishes.
+    `plan` ({index: ("audio", "visual")}) limits the work to those parts; results for
+    segments outside it are None.
+    """
+    os.makedirs(assets_dir, exist_ok=True)
+    if plan is None:
+        plan = {i: ("audio", "visual") for i in range(len(segments))}
+    total = sum(len(parts) for parts in plan.values())
+    done = 0
+
+    def report(i, kind, ok):
+        nonlocal done
+        done += 1
+        if progress_callback:
+            status = "done" if ok else "failed"
+            progress_callback(done, total, f"Segment {i}: {kind} {status}")
+
+    with metrics.span("assets", segments=len(plan)):
+        jobs = [
+            _generate_segment_assets(i, seg, assets_dir, pexels_key, report, plan[i]) if plan.get(i) else _skip()
+            for i, seg in enumerate(segments)
+        ]
+        return await asyncio.gather(*jobs)
+
+def generate_assets(segments, assets_dir, pexels_key=None, progress_callback=None, plan=None):
+    if not progress_callback:
+        return _run(generate_assets_async(segments, assets_dir, pexels_key, plan=plan))
+    events = queue.Queue()
+    coro = generate_assets_async(segments, assets_dir, pexels_key, lambda *event: events.put(event), plan)
+    return _run(coro, events, progress_callback)
+
+class AssetStream:
+    """
+    Starts a segment's audio and visual jobs as soon as it is submitted, e.g. while the LLM is
+    still writing later segments. Progress events are delivered in the submitting thread, on
+    submit() and while close() waits; `total` grows as segments arrive.
+    """
+
+    def __init__(self, assets_dir, pexels_key=None, progress_callback=None):
+        os.makedirs(assets_dir, exist_ok=True)
+        self.assets_dir = assets_dir
+        self.pexels_key = pexels_key
+        self.progress_callback = progress_callback
+        self.submitted = 0
+        self._done = 0
+        self._events = queue.Queue()
+        self._inbox = asyncio.Queue()
+        self._loop = _get_loop()
+        self._future = asyncio.run_coroutine_threadsafe(self._consume(), self._loop)
+
+    async def _consume(self):
+        def report(i, kind, ok):
+            self._events.put((i, kind, ok))
+
+        tasks = []
+        with metrics.span("assets", streaming=True) as span:
+            try:
+                while True:
+                    item = await self._inbox.get()
+                    if item is None:
+                        break
+                    i, seg = item
+                    tasks.append(asyncio.create_task(_generate_segment_assets(i, seg, self.assets_dir, self.pexels_key, report)))
+                span.set(segments=len(tasks))
+                return await asyncio.gather(*tasks)
+            except asyncio.CancelledError:
+                for task in tasks:
+                    task.cancel()
+                raise
+
+    def _deliver(self, timeout=None):
+        try:
+            i, kind, ok = self._events.get(timeout=timeout) if timeout else self._events.get_nowait()
+        except queue.Empty:
+            return False
+        self._done += 1
+        if self.progress_callback:
+            status = "done" if ok else "failed"
+            self.progress_callback(self._done, self.submitted * 2, f"Segment {i}: {kind} {status}")
+        return True
+
+    def submit(self, i, seg):
+        self.submitted += 1
+        self._loop.call_soon_threadsafe(self._inbox.put_nowait, (i, seg))
+        while self._deliver():
+            pass
+
+    def close(self):
+        """Waits for every submitted segment; returns their results in submission order."""
+        self._loop.call_soon_threadsafe(self._inbox.put_nowait, None)
+        while not (self._future.done() and self._events.empty()):
+            self._deliver(timeout=0.1)
+        return self._future.result()
+
+    def cancel(self):
+        self._future.cancel()
@@ -0,0 +1,172 @@
+import os
+import re
+import json
+import math
+import hashlib
+
+from . import ffmpeg, metrics
+
+# Audio stage: the segment voiceovers joined in one ffmpeg pass, normalised with two-pass loudnorm and
+# laid over a ducked music bed picked by the script's music_mood. The renderers mux the finished track
+# once instead of decoding and mixing audio per segment.
+AUDIO_RATE = 44100
+
+# EBU R128 targets; -14 LUFS is what the short-video platforms normalise to anyway
+LOUDNESS_I = -14.0
+LOUDNESS_TP = -1.5
+LOUDNESS_LRA = 11.0
+
+# Local music library: MUSIC_DIR/<mood>/<track>, or mood words in the file names
+MUSIC_DIR = os.environ.get("MUSIC_DIR", "music")
+MUSIC_EXTENSIONS = (".mp3", ".m4a", ".aac", ".wav", ".ogg", ".flac")
+MUSIC_LUFS = -30.0 # bed level under the voice, before ducking
+MUSIC_FADE = 1.5
+# sidechaincompress settings: the bed drops while the voice speaks and comes back in the gaps
+DUCKING = "threshold=0.03:ratio=8:attack=20:release=350"
+
+# Finished tracks, by content key, inside the render's assets dir
+TRACKS_DIR = "audio"
+# Bump when the graph changes so cached tracks are rebuilt
+AUDIO_STAGE_VERSION = 1
+
+def list_tracks(music_dir=None):
+    music_dir = music_dir or MUSIC_DIR
+    tracks = []
+    for root, _, files in os.walk(music_dir):
+        for name in files:
+            if name.lower().endswith(MUSIC_EXTENSIONS):
+                tracks.append(os.path.join(root, name))
+    return sorted(tracks)
+
+def _words(text):
+    return set(re.findall(r"[a-z]+", (text or "").lower()))
+
+def select_track(mood, music_dir=None):
+    """
+    Library track for a free-text mood such as "Upbeat electronic": the one whose folder and file
+    names share the most words with it. Ties are broken by a hash of the mood, so a script always gets
+    the same track. None when the library is empty or nothing matches.
+    """
+    music_dir = music_dir or MUSIC_DIR
+    words = _words(mood)
+    scored = [(len(words & _words(os.path.relpath(path, music_dir))), path) for path in list_tracks(music_dir)]
+    best = max((score for score, _ in scored), default=0)
+    if not best:
+        return None
+    candidates = [path for score, path in scored if score == best]
+    return candidates[int(hashlib.sha1(mood.lower().encode("utf-8")).hexdigest(), 16) % len(candidates)]
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _track_key(voiceovers, music):
+    h = hashlib.sha1(f"{AUDIO_STAGE_VERSION}|{LOUDNESS_I}|{LOUDNESS_TP}|{LOUDNESS_LRA}|{MUSIC_LUFS}|{DUCKING}".encode())
+    for path, duration in voiceovers:
+        h.update(f"|{file_digest(path)}:{duration:.6f}".encode())
+    if music:
+        h.update(f"|music:{file_digest(music)}".encode())
+    return h.hexdigest()[:16]
+
+def _loudnorm(**measured):
+    args = f"loudnorm=I={LOUDNESS_I}:TP={LOUDNESS_TP}:LRA={LOUDNESS_LRA}"
+    return args + "".join(f":{k}={v}" for k, v in measured.items())
+
+def _parse_loudnorm(stderr):
+    # loudnorm prints its measurement as the last JSON object on stderr
+    match = re.search(r"\{[^{}]*\"input_i\"[^{}]*\}", stderr)
+    if not match:
+        return None
+    stats = json.loads(match.group(0))
+    if not all(math.isfinite(float(stats[k])) for k in ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")):
+        return None # Silence: nothing to measure
+    return stats
+
+def _join_voiceovers(voiceovers, voice_path):
+    """
+    Pass 1: every voiceover padded (or cut) to its segment's duration and concatenated, written to
+    voice_path while loudnorm measures it. Returns the measurement, or None if there was nothing to measure.
+    """
+    args, chains = [], []
+    for k, (path, duration) in enumerate(voiceovers):
+        args += ["-i", path]
+        chains.append(
+            f"[{k}:a]aresample={AUDIO_RATE},aformat=sample_fmts=fltp:channel_layouts=stereo,"
+            f"apad,atrim=0:{duration:.6f},asetpts=PTS-STARTPTS[s{k}]"
+        )
+    pads = "".join(f"[s{k}]" for k in range(len(voiceovers)))
+    chains.append(f"{pads}concat=n={len(voiceovers)}:v=0:a=1,asplit[voice][measure]")
+    chains.append(f"[measure]{_loudnorm(print_format='json')},anullsink")
+    args += ["-filter_complex", ";".join(chains), "-map", "[voice]", "-c:a", "pcm_f32le", voice_path]
+    return _parse_loudnorm(ffmpeg.run(args, capture=True).stderr)
+
+def _master(voice_path, stats, music, duration, output_path):
+    """Pass 2: linear loudness correction from the measurement, then the ducked music bed."""
+    args = ["-i", voice_path]
+    voice = "[0:a]"
+    if stats:
+        voice += _loudnorm(
+            measured_I=stats["input_i"], measured_TP=stats["input_tp"], measured_LRA=stats["input_lra"],
+            measured_thresh=stats["input_thresh"], offset=stats["target_offset"], linear="true",
+        ) + "," # loudnorm works at 192 kHz
+    chains = [f"{voice}aresample={AUDIO_RATE}[voice]"]
+    if music:
+        args += ["-stream_loop", "-1", "-i", music]
+        chains += [
+            f"[1:a]aresample={AUDIO_RATE},aformat=sample_fmts=fltp:channel_layouts=stereo,atrim=0:{duration:.6f},"
+            f"asetpts=PTS-STARTPTS,loudnorm=I={MUSIC_LUFS}:TP={LOUDNESS_TP},aresample={AUDIO_RATE},"
+            f"afade=t=in:d={MUSIC_FADE},afade=t=out:st={max(duration - MUSIC_FADE, 0):.3f}:d={MUSIC_FADE}[bed]",
+            "[voice]asplit[speech][key]",
+            f"[bed][key]sidechaincompress={DUCKING}[ducked]",
+            # The bed adds a little level on top of the normalised voice; keep the peak target
+            f"[speech][ducked]amix=inputs=2:duration=first:normalize=0,"
+            f"alimiter=limit={10 ** (LOUDNESS_TP / 20):.3f}:level=false[mix]",
+        ]
+        out = "[mix]"
+    else:
+        out = "[voice]"
+    args += ["-filter_complex", ";".join(chains), "-map", out, "-c:a", "pcm_s16le", "-ar", str(AUDIO_RATE), "-ac", "2", output_path]
+    ffmpeg.run(args)
+
+def build_track(voiceovers, work_dir, mood=None):
+    """
+    The finished soundtrack for a render, as a WAV path. `voiceovers` is [(mp3 path, segment duration)]
+    in timeline order; each voiceover is padded with silence to exactly its segment's duration, so the
+    track lines up with the video segment for segment. A matching music bed is mixed in when the library
+    has one. Tracks are cached in work_dir by content. None on failure.
+    """
+    if not voiceovers:
+        return None
+    with metrics.span("audio", voiceovers=len(voiceovers)) as span:
+        try:
+            music = select_track(mood) if mood else None
+            tracks_dir = os.path.join(work_dir, TRACKS_DIR)
+            os.makedirs(tracks_dir, exist_ok=True)
+            output_path = os.path.join(tracks_dir, f"{_track_key(voiceovers, music)}.wav")
+            span.set(music=os.path.basename(music) if music else None, cached=os.path.exists(output_path))
+            if os.path.exists(output_path):
+                return output_path
+
+            voice_path = output_path + ".voice.wav"
+            tmp_path = f"{output_path}.{os.getpid()}.wav"
+            try:
+                stats = _join_voiceovers(voiceovers, voice_path)
+                _master(voice_path, stats, music, sum(d for _, d in voiceovers), tmp_path)
+                os.replace(tmp_path, output_path)
+            finally:
+                for tmp in (voice_path, tmp_path):
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+            if stats:
+                span.set(input_lufs=float(stats["input_i"]))
+            # Only the current track is worth keeping
+            for old in os.listdir(tracks_dir):
+                if old.endswith(".wav") and os.path.join(tracks_dir, old) != output_path:
+                    os.remove(os.path.join(tracks_dir, old))
+            return output_path
+        except Exception as e:
+            print(f"Audio Error: {e}")
+            return None
@@ -0,0 +1,277 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import ingestion, synthesis, assets, video, metrics, ffmpeg
+
+# Headless batch runner. Stages are pipelined: job N+1 is scripted and gathers assets
+# while job N renders. Each stage has its own worker pool.
+DEFAULT_CONCURRENCY = {
+    "script": 2,
+    "assets": 2,
+    "render": max(1, (os.cpu_count() or 2) // 2),
+}
+RUNS_DIR = "runs"
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:40] or "job"
+
+def _warm_worker():
+    # Pay import, font and ffmpeg start-up costs once per render process, not once per video
+    video._load_font()
+    video.render_caption("")
+    ffmpeg.run(["-f", "lavfi", "-i", "color=size=16x16:duration=0.04", "-f", "null", "-"])
+
+def _render_job(script, assets_dir, output_file, backend, profile=video.DEFAULT_PROFILE):
+    """Runs in a render worker process; returns what the parent records for the job."""
+    with metrics.span("render_job") as span:
+        ok = video.make_video(script, assets_dir, output_file, backend=backend, profile=profile)
+    render = next((s for s in metrics.recorder.to_dicts() if s["name"] == "render"), {})
+    metrics.recorder.reset()
+    return {"ok": ok, "render_s": round(span.wall, 3), "encode_fps": render.get("encode_fps"), "output_bytes": render.get("output_bytes")}
+
+class BatchRunner:
+    def __init__(self, runs_dir=RUNS_DIR, concurrency=None, gemini_key=None, groq_key=None,
+                 pexels_key=None, backend="ffmpeg", on_update=None, script_batch=1, profile=video.DEFAULT_PROFILE):
+        self.runs_dir = runs_dir
+        self.concurrency = dict(DEFAULT_CONCURRENCY, **(concurrency or {}))
+        self.gemini_key = gemini_key
+        self.groq_key = groq_key
+        self.pexels_key = pexels_key
+        self.backend = backend
+        self.profile = profile
+        self.on_update = on_update
+        self.script_batch = script_batch
+        self._script_pool = ThreadPoolExecutor(self.concurrency["script"], thread_name_prefix="batch-script")
+        self._asset_pool = ThreadPoolExecutor(self.concurrency["assets"], thread_name_prefix="batch-assets")
+        # Render workers stay alive for the whole batch (and across run() calls). Spawned, not forked:
+        # the stage threads may hold locks at fork time, and warm workers make the start-up cost a one-off
+        self._render_pool = self._new_render_pool()
+        self._lock = threading.Lock()
+
+    def _new_render_pool(self):
+        return ProcessPoolExecutor(
+            self.concurrency["render"],
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+        )
+
+    def _submit_render(self, *args):
+        with self._lock:
+            try:
+                return self._render_pool.submit(_render_job, *args)
+            except BrokenProcessPool:
+                # A render worker died (e.g. out of memory) and took the pool with it; start a fresh one
+                self._render_pool.shutdown(wait=False)
+                self._render_pool = self._new_render_pool()
+                return self._render_pool.submit(_render_job, *args)
+
+    def close(self):
+        self._script_pool.shutdown()
+        self._asset_pool.shutdown()
+        self._render_pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _new_job(self, n, item):
+        topic = item if isinstance(item, str) else item.get("title", "")
+        job_id = f"{n:03d}-{_slug(topic)}"
+        workspace = os.path.join(self.runs_dir, job_id)
+        os.makedirs(os.path.join(workspace, "data"), exist_ok=True)
+        os.makedirs(os.path.join(workspace, "assets"), exist_ok=True)
+        return {
+            "id": job_id,
+            "item": item,
+            "workspace": workspace,
+            "status": "queued",
+            "timings": {},
+        }
+
+    def _update(self, job, status, **fields):
+        with self._lock:
+            job["status"] = status
+            job.update(fields)
+        if self.on_update:
+            self.on_update(job)
+
+    def _prescript(self, jobs):
+        # News items need no ingestion, so they can share LLM requests up front
+        batchable = [job for job in jobs if isinstance(job["item"], dict)]
+        if self.script_batch <= 1 or len(batchable) < 2:
+            return
+        started = time.perf_counter()
+        scripts = synthesis.generate_scripts(
+            [job["item"] for job in batchable],
+            gemini_key=self.gemini_key,
+            groq_key=self.groq_key,
+            batch_size=self.script_batch,
+            fallback=False, # leftovers go through the normal script stage
+        )
+        elapsed = round((time.perf_counter() - started) / len(batchable), 3)
+        for job, script in zip(batchable, scripts):
+            if script:
+                job["script"] = script
+                job["timings"]["script_s"] = elapsed
+
+    def _script_stage(self, job):
+        if job.get("script"):
+            job["title"] = job["item"]["title"]
+            with open(os.path.join(job["workspace"], "data", "script.json"), "w") as f:
+                json.dump([job["script"]], f)
+            return
+        started = time.perf_counter()
+        self._update(job, "scripting")
+        with metrics.span("batch.script", job=job["id"]):
+            item = job["item"]
+            if isinstance(item, str):
+                news_item = ingestion.fetch_news_topic(item) or {"title": item, "content": f"A video about {item}"}
+            else:
+                news_item = item
+            script = synthesis.generate_script(news_item, gemini_key=self.gemini_key, groq_key=self.groq_key)
+        if not script:
+            raise RuntimeError("Script generation failed.")
+        with open(os.path.join(job["workspace"], "data", "script.json"), "w") as f:
+            json.dump([script], f)
+        job["title"] = news_item["title"]
+        job["script"] = script
+        job["timings"]["script_s"] = round(time.perf_counter() - started, 3)
+
+    def _asset_stage(self, job):
+        started = time.perf_counter()
+        self._update(job, "assets")
+        assets_dir = os.path.join(job["workspace"], "assets")
+        assets.generate_assets(job["script"].get("segments", []), assets_dir, pexels_key=self.pexels_key)
+        job["timings"]["assets_s"] = round(time.perf_counter() - started, 3)
+
+    def _run_pipeline(self, job, done):
+        def fail(stage, error):
+            self._update(job, "failed", error=f"{stage}: {error}")
+            done()
+
+        def after_assets(future):
+            if future.exception():
+                return fail("assets", future.exception())
+            self._update(job, "rendering")
+            output = os.path.join(job["workspace"], "final.mp4")
+            # Done-callbacks swallow exceptions; one raised here would leave run() waiting forever
+            try:
+                render = self._submit_render(job["script"], os.path.join(job["workspace"], "assets"), output, self.backend, self.profile)
+            except Exception as e:
+                return fail("render", e)
+            render.add_done_callback(lambda f: after_render(f, output))
+
+        def after_render(future, output):
+            if future.exception():
+                return fail("render", future.exception())
+            result = future.result()
+            job["timings"]["render_s"] = result["render_s"]
+            job["timings"]["encode_fps"] = result["encode_fps"]
+            job["timings"]["output_bytes"] = result["output_bytes"]
+            if result["ok"]:
+                self._update(job, "done", output=output)
+            else:
+                self._update(job, "failed", error="render: make_video returned False")
+            done()
+
+        def after_script(future):
+            if future.exception():
+                return fail("script", future.exception())
+            try:
+                self._asset_pool.submit(self._asset_stage, job).add_done_callback(after_assets)
+            except Exception as e:
+                fail("assets", e)
+
+        self._script_pool.submit(self._script_stage, job).add_done_callback(after_script)
+
+    def run(self, items):
+        """Runs every topic string or news dict through the pipeline and returns the job records."""
+        jobs = [self._new_job(n, item) for n, item in enumerate(items)]
+        if not jobs:
+            return []
+        remaining = [len(jobs)]
+        finished = threading.Event()
+
+        def done():
+            with self._lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    finished.set()
+
+        started = time.perf_counter()
+        self._prescript(jobs)
+        for job in jobs:
+            self._run_pipeline(job, done)
+        finished.wait()
+        elapsed = time.perf_counter() - started
+
+        summary = {
+            "jobs": [{k: v for k, v in job.items() if k != "script"} for job in jobs],
+            "elapsed_s": round(elapsed, 3),
+            "videos_per_hour": round(sum(j["status"] == "done" for j in jobs) / elapsed * 3600, 1) if elapsed else None,
+            "script_cache": synthesis.cache_stats(),
+            "script_routing": synthesis.router.stats(),
+            "script_batch_routing": synthesis.batch_router.stats(),
+        }
+        with open(os.path.join(self.runs_dir, "batch_summary.json"), "w") as f:
+            json.dump(summary, f, indent=2, default=str)
+        return jobs
+
+def _load_items(args):
+    items = list(args.topics)
+    if args.topics_file:
+        with open(args.topics_file, encoding="utf-8") as f:
+            items += [line.strip() for line in f if line.strip()]
+    if args.news_json:
+        with open(args.news_json, encoding="utf-8") as f:
+            items += json.load(f)
+    return items
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render many videos in one process.")
+    parser.add_argument("topics", nargs="*", help="topics to fetch news for")
+    parser.add_argument("--topics-file", help="one topic per line")
+    parser.add_argument("--news-json", help="JSON list of {title, content} news items")
+    parser.add_argument("--runs-dir", default=RUNS_DIR)
+    parser.add_argument("--backend", default="ffmpeg", choices=video.RENDER_BACKENDS)
+    parser.add_argument("--profile", default=video.DEFAULT_PROFILE, choices=list(video.ENCODER_PROFILES))
+    parser.add_argument("--script-batch", type=int, default=1, help="news items scripted per LLM request")
+    for stage, n in DEFAULT_CONCURRENCY.items():
+        parser.add_argument(f"--{stage}-workers", type=int, default=n)
+    args = parser.parse_args(argv)
+
+    items = _load_items(args)
+    if not items:
+        parser.error("no topics or news items given")
+
+    concurrency = {stage: getattr(args, f"{stage}_workers") for stage in DEFAULT_CONCURRENCY}
+    runner = BatchRunner(
+        runs_dir=args.runs_dir,
+        concurrency=concurrency,
+        gemini_key=os.environ.get("GEMINI_API_KEY"),
+        groq_key=os.environ.get("GROQ_API_KEY"),
+        pexels_key=os.environ.get("PEXELS_API_KEY"),
+        backend=args.backend,
+        profile=args.profile,
+        script_batch=args.script_batch,
+        on_update=lambda job: print(f"[{job['id']}] {job['status']}"),
+    )
+    with runner:
+        jobs = runner.run(items)
+    failed = [j for j in jobs if j["status"] != "done"]
+    for job in failed:
+        print(f"[{job['id']}] {job.get('error')}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
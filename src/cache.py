@@ -0,0 +1,183 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+# Content-addressed store for generated/downloaded media (TTS, images, stock clips)
+CACHE_DIR = os.environ.get("ASSET_CACHE_DIR", os.path.join(".cache", "assets"))
+CACHE_MAX_BYTES = int(os.environ.get("ASSET_CACHE_MAX_MB", "2048")) * 1024 * 1024
+# Eviction frees down to this share of the limit, so the stores right after it do not evict again
+EVICT_TO = 0.9
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def _tmp_name(path):
+    # Unique per process and thread: job workers in other processes write to the same store
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def _link_or_copy(src, dst):
+    # Write through a temp name so readers never see a half-written file
+    tmp = _tmp_name(dst)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        # A tmp left by a crashed writer may be a hard link to another entry; copying into it would
+        # overwrite that entry's content
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        shutil.copyfile(src, tmp)
+    try:
+        os.replace(tmp, dst)
+    except OSError:
+        os.unlink(tmp)
+        raise
+
+class AssetCache:
+    """
+    Files keyed by a hash of (provider, params...), evicted least-recently-used
+    once the store grows past max_bytes.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = None # running total of the store; scanned on the first write
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(provider, *params):
+        raw = json.dumps([provider, *params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def path(self, key, ext=""):
+        return os.path.join(self.root, key[:2], key + ext)
+
+    def fetch(self, key, ext, output_file):
+        """Copies a cached entry to output_file. Returns False on a miss."""
+        path = self.path(key, ext)
+        try:
+            _link_or_copy(path, output_file)
+            os.utime(path)  # mtime doubles as the LRU clock
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key, ext, src_file):
+        path = self.path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        replaced = _size(path)
+        try:
+            _link_or_copy(src_file, path)
+        except OSError as e:
+            print(f"Cache store failed: {e}")
+            return
+        self._added(path, replaced)
+
+    def get_json(self, key):
+        """Small JSON values (e.g. LLM scripts) share the same layout and LRU. None on a miss."""
+        path = self.path(key, ".json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put_json(self, key, value):
+        path = self.path(key, ".json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = _tmp_name(path)
+        replaced = _size(path)
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Cache store failed: {e}")
+            return
+        self._added(path, replaced)
+
+    def _added(self, path, replaced):
+        # The total is approximate (other processes write to the same store), but it only has to
+        # say when a full scan is worth it; evict() recounts from disk
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._bytes += _size(path) - replaced
+            over = self._bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def _entries(self):
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def evict(self):
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries if total > self.max_bytes else ():
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    self.evictions += 1
+                except OSError:
+                    pass
+            self._bytes = total
+
+    def stats(self):
+        entries = list(self._entries())
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_cache():
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = AssetCache()
+    return _default_cache
+
+def set_cache(cache):
+    """Swaps the process-wide cache, e.g. for an isolated job workspace or a benchmark."""
+    global _default_cache
+    with _default_lock:
+        _default_cache = cache
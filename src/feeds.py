@@ -0,0 +1,169 @@
+import os
+import re
+import time
+import sqlite3
+import calendar
+import threading
+
+from . import lazy, metrics, net
+
+feedparser = lazy.module("feedparser")
+
+# Persistent RSS state for polling: validators for conditional GETs, the last body (so a 304
+# still yields entries) and the IDs of every entry already handed out
+FEED_DB = os.environ.get("FEED_DB", os.path.join(".cache", "feeds.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    body BLOB,
+    fetched REAL
+);
+CREATE TABLE IF NOT EXISTS seen (
+    entry_id TEXT PRIMARY KEY,
+    title_key TEXT,
+    feed_url TEXT,
+    first_seen REAL
+);
+CREATE INDEX IF NOT EXISTS seen_title ON seen (title_key);
+"""
+
+def entry_id(entry):
+    return entry.get("id") or entry.get("link")
+
+def title_key(title):
+    # Google News titles end in " - Publisher"; the same story from several topics should match
+    title = re.sub(r"\s+-\s+[^-]+$", "", title or "")
+    return re.sub(r"[^a-z0-9]+", " ", title.lower()).strip()
+
+def _published(entry):
+    parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+    return calendar.timegm(parsed) if parsed else 0
+
+class FeedStore:
+    def __init__(self, path=FEED_DB):
+        self.path = path
+        self.not_modified = 0
+        self.downloads = 0
+        self._parsed = {} # url -> (fetched, parsed feed), so a 304 skips re-parsing too
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def fetch(self, url):
+        """Parsed feed for url, downloading only if it changed since the last fetch. None on failure."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT etag, last_modified, body, fetched FROM feeds WHERE url = ?", (url,)).fetchone()
+
+        headers = {}
+        if row and row[2] is not None:
+            if row[0]:
+                headers["If-None-Match"] = row[0]
+            if row[1]:
+                headers["If-Modified-Since"] = row[1]
+        try:
+            response = net.get(url, headers=headers, timeout=10)
+        except Exception as e:
+            print(f"RSS fetch failed: {e}")
+            response = None
+
+        if response is not None and response.status_code == 304:
+            with self._lock:
+                self.not_modified += 1
+            with self._connect() as conn:
+                conn.execute("UPDATE feeds SET fetched = ? WHERE url = ?", (time.time(), url))
+            return self._parse(url, row[3], row[2])
+
+        if response is None or response.status_code != 200:
+            if response is not None:
+                print(f"RSS fetch failed: HTTP {response.status_code}")
+            # Serve the last good copy rather than nothing
+            return self._parse(url, row[3], row[2]) if row and row[2] is not None else None
+
+        with self._lock:
+            self.downloads += 1
+        fetched = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO feeds (url, etag, last_modified, body, fetched) VALUES (?, ?, ?, ?, ?)",
+                (url, response.headers.get("ETag"), response.headers.get("Last-Modified"), response.content, fetched),
+            )
+        return self._parse(url, fetched, response.content)
+
+    def _parse(self, url, version, body):
+        with self._lock:
+            cached = self._parsed.get(url)
+        if cached and cached[0] == version:
+            return cached[1]
+        feed = feedparser.parse(body)
+        with self._lock:
+            self._parsed[url] = (version, feed)
+        return feed
+
+    def new_entries(self, feeds, limit=None):
+        """
+        Entries not handed out before, across `feeds` ({name: url}), newest first and de-duplicated
+        by entry ID and headline. Returned entries are marked seen.
+        """
+        with metrics.span("feeds.poll", feeds=len(feeds)) as span:
+            candidates = []
+            for name, url in feeds.items():
+                feed = self.fetch(url)
+                if not feed:
+                    continue
+                for rank, entry in enumerate(feed.entries):
+                    candidates.append((-_published(entry), rank, name, url, entry))
+            candidates.sort(key=lambda c: c[:2])
+
+            fresh, ids, titles = [], set(), set()
+            with self._connect() as conn:
+                for _, rank, name, url, entry in candidates:
+                    eid, tkey = entry_id(entry), title_key(entry.get("title"))
+                    if not eid or eid in ids or (tkey and tkey in titles):
+                        continue
+                    ids.add(eid)
+                    titles.add(tkey)
+                    seen = conn.execute(
+                        "SELECT 1 FROM seen WHERE entry_id = ? OR (title_key != '' AND title_key = ?)", (eid, tkey)
+                    ).fetchone()
+                    if seen:
+                        continue
+                    fresh.append({"topic": name, "feed": url, "rank": rank, "entry": entry})
+                    if limit and len(fresh) >= limit:
+                        break
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR IGNORE INTO seen (entry_id, title_key, feed_url, first_seen) VALUES (?, ?, ?, ?)",
+                    [(entry_id(f["entry"]), title_key(f["entry"].get("title")), f["feed"], now) for f in fresh],
+                )
+            span.set(candidates=len(candidates), new=len(fresh))
+        return fresh
+
+    def stats(self):
+        with self._connect() as conn:
+            seen = conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+        return {"downloads": self.downloads, "not_modified": self.not_modified, "seen": seen}
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def get_store():
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = FeedStore()
+    return _default_store
+
+def set_store(store):
+    global _default_store
+    with _default_lock:
+        _default_store = store
@@ -0,0 +1,42 @@
+import re
+import subprocess
+
+# moviepy already ships a static ffmpeg through imageio-ffmpeg; prefer it over PATH
+try:
+    import imageio_ffmpeg
+    FFMPEG_BINARY = imageio_ffmpeg.get_ffmpeg_exe()
+except Exception:
+    FFMPEG_BINARY = "ffmpeg"
+
+class FFmpegError(RuntimeError):
+    pass
+
+def run(args, capture=False):
+    """Runs ffmpeg with the given arguments. Raises FFmpegError with its stderr on failure."""
+    cmd = [FFMPEG_BINARY, "-hide_banner", "-nostdin", "-y", *args]
+    if not capture:
+        cmd[1:1] = ["-loglevel", "error"]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise FFmpegError(result.stderr.strip()[-2000:])
+    return result
+
+def open_writer(args):
+    """Starts ffmpeg reading from a pipe (e.g. raw frames on stdin). Finish with close_writer()."""
+    cmd = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y", *args]
+    return subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+def close_writer(process):
+    process.stdin.close()
+    stderr = process.stderr.read().decode("utf-8", "replace")
+    if process.wait() != 0:
+        raise FFmpegError(stderr.strip()[-2000:])
+
+def probe_duration(path):
+    """Container duration in seconds (ffprobe is not bundled, so parse ffmpeg's banner)."""
+    result = subprocess.run([FFMPEG_BINARY, "-hide_banner", "-i", path], capture_output=True, text=True)
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+    if not match:
+        return 0
+    h, m, s = match.groups()
+    return int(h) * 3600 + int(m) * 60 + float(s)
@@ -1,43 +1,175 @@
 
-import feedparser
-import trafilatura
-import requests
 import time
+import threading
+import contextvars
+from urllib.parse import quote_plus
+from concurrent.futures import ThreadPoolExecutor
+from . import feeds, lazy, metrics, net
+
+trafilatura = lazy.module("trafilatura")
+
+MAX_ENTRIES = 5
+MIN_ARTICLE_CHARS = 200
+CACHE_TTL = 30 * 60 # seconds
+CACHE_MAX_ITEMS = 512 # per cache; the article text cache holds whole pages
+
+class TTLCache:
+    """
+    Small thread-safe in-memory cache whose entries expire `ttl` seconds after being set.
+    Holds at most max_items; the oldest entries go first.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, max_items=CACHE_MAX_ITEMS):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit and hit[0] > time.monotonic():
+                return True, hit[1]
+            self._data.pop(key, None)
+            return False, None
+
+    def set(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (now + self.ttl, value)
+            # Every entry lives for the same ttl, so insertion order is expiry order: the expired
+            # ones, and the oldest past the size bound, sit at the front
+            while self._data:
+                oldest = next(iter(self._data))
+                if self._data[oldest][0] > now and len(self._data) <= self.max_items:
+                    break
+                del self._data[oldest]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+# Keyed by RSS link and resolved URL; failures are cached too so dead links are not retried every click
+_resolved_cache = TTLCache()
+_text_cache = TTLCache()
 
 def resolve_url(url):
     try:
-        response = requests.head(url, allow_redirects=True, timeout=10)
+        response = net.head(url, allow_redirects=True, timeout=10)
         return response.url
     except Exception as e:
         print(f"Error resolving URL {url}: {e}")
         return url
 
-def fetch_news_topic(topic="AI"):
+def fetch_html(url):
+    try:
+        response = net.get(url, timeout=(5, 15))
+        if response.status_code == 200:
+            return response.text
+    except Exception as e:
+        print(f"Error fetching {url}: {e}")
+    return None
+
+def extract_article(url, cancelled=None):
+    """
+    Downloaded and extracted article text for `url`, or None. Cached with a TTL.
+    Stops before extracting once `cancelled` (a threading.Event) is set.
+    """
+    found, text = _text_cache.get(url)
+    if found:
+        return text
+    text = None
+    downloaded = fetch_html(url)
+    if cancelled is not None and cancelled.is_set():
+        return None
+    if downloaded:
+        text = trafilatura.extract(downloaded)
+    _text_cache.set(url, text)
+    return text
+
+def _process_entry(entry, cancelled=None):
+    # `cancelled` is set once the caller no longer needs this entry; it is checked between the network steps
+    stopped = lambda: cancelled is not None and cancelled.is_set()
+    if stopped():
+        return None
+    found, resolved = _resolved_cache.get(entry.link)
+    if not found:
+        resolved = resolve_url(entry.link)
+        _resolved_cache.set(entry.link, resolved)
+
+    # Skip Google loopbacks if resolution fails
+    if "google.com" in resolved and "articles" not in resolved:
+        return None
+    if stopped():
+        return None
+
+    text = extract_article(resolved, cancelled)
+    if text and len(text) > MIN_ARTICLE_CHARS:
+        return {
+            "title": entry.title,
+            "link": resolved,
+            "content": text
+        }
+    return None
+
+def topic_feed_url(topic):
     # Google News RSS for specific topic
-    rss_url = f"https://news.google.com/rss/search?q={topic}&hl=en-US&gl=US&ceid=US:en"
+    return f"https://news.google.com/rss/search?q={quote_plus(topic)}&hl=en-US&gl=US&ceid=US:en"
+
+def fetch_news_topic(topic="AI", max_entries=MAX_ENTRIES):
+    with metrics.span("ingestion", topic=topic):
+        return _fetch_news_topic(topic, max_entries)
+
+def _fetch_news_topic(topic, max_entries):
     print(f"Fetching RSS for {topic}...")
-    feed = feedparser.parse(rss_url)
-    
-    if not feed.entries:
+    feed = feeds.get_store().fetch(topic_feed_url(topic))
+    if not feed or not feed.entries:
         return None
         
-    # Try top 3 entries
-    for entry in feed.entries[:3]:
+    # Resolve and scrape the top entries in parallel. The best-ranked article that qualifies wins:
+    # return once it and every entry ranked above it are done, and stop the rest at their next step
+    entries = feed.entries[:max_entries]
+    pool = ThreadPoolExecutor(len(entries), thread_name_prefix="ingest")
+    cancelled = threading.Event()
+    futures = []
+    for entry in entries:
         print(f"Processing: {entry.title}")
-        resolved = resolve_url(entry.link)
-        
-        # Skip Google loopbacks if resolution fails
-        if "google.com" in resolved and "articles" not in resolved: 
-             continue
-             
-        downloaded = trafilatura.fetch_url(resolved)
-        if downloaded:
-            text = trafilatura.extract(downloaded)
-            if text and len(text) > 200:
-                return {
-                    "title": entry.title,
-                    "link": resolved,
-                    "content": text
-                }
-    
-    return None
+        futures.append(pool.submit(contextvars.copy_context().run, _process_entry, entry, cancelled))
+    try:
+        for future in futures:
+            try:
+                article = future.result()
+            except Exception as e:
+                print(f"Entry failed: {e}")
+                continue
+            if article:
+                return article
+        return None
+    finally:
+        cancelled.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def poll_topics(topics, limit=None):
+    """
+    Yields articles for entries not seen on earlier polls, across all topics, newest first
+    and de-duplicated. Unchanged feeds cost a 304. Extraction runs concurrently, results
+    come out in rank order; entries without a usable article are skipped.
+    """
+    fresh = feeds.get_store().new_entries({t: topic_feed_url(t) for t in topics}, limit=limit)
+    if not fresh:
+        return
+
+    def process(entry):
+        try:
+            return _process_entry(entry)
+        except Exception as e:
+            print(f"Entry failed: {e}")
+            return None
+
+    with ThreadPoolExecutor(min(len(fresh), MAX_ENTRIES), thread_name_prefix="ingest") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, process, f["entry"]) for f in fresh]
+        for item, future in zip(fresh, futures):
+            article = future.result()
+            if article:
+                yield dict(article, topic=item["topic"])
@@ -0,0 +1,331 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import synthesis, assets, video, metrics
+from .batch import _warm_worker
+
+# Local render service: a SQLite-backed queue drained by a pool of worker processes.
+# The Streamlit app submits and polls; renders survive reruns and disconnects.
+JOBS_DIR = "jobs"
+DB_NAME = "jobs.db"
+POLL_INTERVAL = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    cache_key TEXT,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE INDEX IF NOT EXISTS jobs_cache_key ON jobs (cache_key);
+"""
+
+ACTIVE = ("queued", "running")
+# Jobs submitted with this profile get one picked by video.select_profile when a worker starts them
+AUTO_PROFILE = "auto"
+
+class JobCancelled(Exception):
+    pass
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+def _cache_key(params):
+    # Timing recorded before submission says nothing about the video
+    params = {k: v for k, v in params.items() if k != "ingestion_timing"}
+    raw = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+class _Progress:
+    """Writes progress to the job row and raises JobCancelled once a cancel has been requested."""
+
+    def __init__(self, db_path, job_id):
+        self.db_path = db_path
+        self.job_id = job_id
+
+    def __call__(self, percent, message):
+        with _connect(self.db_path) as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = ?, updated = ? WHERE id = ?",
+                (int(percent), message, time.time(), self.job_id),
+            )
+            cancel = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (self.job_id,)).fetchone()[0]
+        if cancel:
+            raise JobCancelled()
+
+def run_pipeline(params, secrets, workspace, progress):
+    """
+    Synthesis -> assets -> render for one news item inside `workspace`.
+    Returns the result record stored on the job.
+    """
+    data_dir = os.path.join(workspace, "data")
+    assets_dir = os.path.join(workspace, "assets")
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(assets_dir, exist_ok=True)
+    metrics.recorder.reset()
+    # The app's "Fetch Trending Topics" ran in its own process; its spans belong in this video's report
+    for row in params.get("ingestion_timing", ()):
+        metrics.recorder.record(metrics.Span.from_dict(row))
+    news_item = params["news_item"]
+
+    # Assets for each segment start while the LLM is still writing the rest of the script
+    pexels_key = secrets.get("PEXELS_API_KEY") if params.get("use_pexels") else None
+    stream = assets.AssetStream(
+        assets_dir,
+        pexels_key=pexels_key,
+        progress_callback=lambda done, total, message: progress(30 + int(done / total * 40), f"Generating Assets... {message}"),
+    )
+    progress(10, "AI Scripting...")
+    try:
+        script = synthesis.generate_script_stream(
+            news_item,
+            gemini_key=secrets.get("GEMINI_API_KEY"),
+            groq_key=secrets.get("GROQ_API_KEY"),
+            on_segment=stream.submit,
+        )
+        if not script:
+            raise RuntimeError("Script generation failed.")
+        with open(os.path.join(data_dir, "script.json"), "w") as f:
+            json.dump([script], f)
+        stream.close()
+    except BaseException:
+        stream.cancel()
+        raise
+    segments = script.get("segments", [])
+
+    backend = params.get("backend", "moviepy")
+    profile = params.get("profile", video.DEFAULT_PROFILE)
+    progress(70, f"Rendering Video ({backend}, {profile})...")
+    output_video = os.path.join(workspace, "final_output.mp4")
+    if not video.make_video(script, assets_dir, output_video, backend=backend, motion=params.get("motion", video.DEFAULT_MOTION), profile=profile):
+        raise RuntimeError("Video rendering failed.")
+    # The render has no progress updates of its own; honour a cancel pressed while it ran
+    progress(90, "Writing Report...")
+    render = next((s for s in metrics.recorder.to_dicts() if s["name"] == "render"), {})
+
+    report = f"""# Video Generation Report
+**Topic**: {news_item['title']}
+**Segments**: {len(segments)}
+**Music Mood**: {script.get('music_mood', 'N/A')}
+
+## Script
+"""
+    for seg in segments:
+        report += f"- {seg['text']} (Visual: {seg['image_prompt']})\n"
+    report += "\n## Timing\n" + metrics.recorder.summary_markdown() + "\n"
+    report_path = os.path.join(workspace, "report.md")
+    with open(report_path, "w") as f:
+        f.write(report)
+    metrics.recorder.export_jsonl(os.path.join(workspace, "spans.jsonl"))
+    metrics.recorder.export_chrome_trace(os.path.join(workspace, "trace.json"))
+
+    return {
+        "output": output_video,
+        "report": report_path,
+        "script": script,
+        "timing": metrics.recorder.summary(),
+        "script_cache": synthesis.cache_stats(),
+        "asset_cache": assets.cache_stats(),
+        "encode": {"profile": profile, "encode_fps": render.get("encode_fps"), "output_bytes": render.get("output_bytes")},
+    }
+
+def _run_job(db_path, jobs_dir, job_id, secrets, profile=video.DEFAULT_PROFILE):
+    """Entry point in the worker process. `profile` stands in for an "auto" profile in the job's params."""
+    with _connect(db_path) as conn:
+        job = _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+    params = job["params"]
+    if params.get("profile") == AUTO_PROFILE:
+        params = dict(params, profile=profile)
+    progress = _Progress(db_path, job_id)
+    status, result, error = "done", None, None
+    try:
+        result = run_pipeline(params, secrets, os.path.join(jobs_dir, job_id), progress)
+        progress(100, "Done") # Last cancellation check before the job is marked done
+    except JobCancelled:
+        status = "cancelled"
+    except Exception as e:
+        status, error = "failed", str(e)
+
+    with _connect(db_path) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, progress = CASE WHEN ? = 'done' THEN 100 ELSE progress END, message = ?, "
+            "result = ?, error = ?, updated = ? WHERE id = ?",
+            (status, status, status.capitalize(), json.dumps(result) if result else None, error, time.time(), job_id),
+        )
+
+class JobService:
+    def __init__(self, jobs_dir=JOBS_DIR, workers=2):
+        self.jobs_dir = jobs_dir
+        self.db_path = os.path.join(jobs_dir, DB_NAME)
+        self.workers = workers
+        os.makedirs(jobs_dir, exist_ok=True)
+        with _connect(self.db_path) as conn:
+            conn.executescript(SCHEMA)
+            # Workers died with the previous process; run their jobs again
+            conn.execute("UPDATE jobs SET status = 'queued', progress = 0 WHERE status = 'running'")
+
+        self._secrets = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pool = self._new_pool()
+        threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True).start()
+
+    def submit(self, params, secrets=None):
+        """
+        Queues a render and returns its job id. An identical finished job whose video
+        is still on disk is returned instead of rendering again.
+        """
+        cache_key = _cache_key(params)
+        with _connect(self.db_path) as conn:
+            for row in conn.execute(
+                "SELECT * FROM jobs WHERE cache_key = ? AND status IN ('done', 'queued', 'running') ORDER BY created DESC",
+                (cache_key,),
+            ):
+                job = _row_to_job(row)
+                if job["status"] in ACTIVE or os.path.exists(job["result"]["output"]):
+                    return job["id"]
+
+            job_id = uuid.uuid4().hex[:12]
+            now = time.time()
+            # API keys stay in memory; they are never written to the queue. They are in place before
+            # the row commits, so the dispatcher can never claim the job without them
+            self._secrets[job_id] = dict(secrets or {})
+            try:
+                conn.execute(
+                    "INSERT INTO jobs (id, cache_key, status, message, params, created, updated) VALUES (?, ?, 'queued', 'Queued', ?, ?, ?)",
+                    (job_id, cache_key, json.dumps(params), now, now),
+                )
+            except Exception:
+                self._secrets.pop(job_id, None)
+                raise
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        with _connect(self.db_path) as conn:
+            return _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list_jobs(self, limit=20):
+        with _connect(self.db_path) as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [_row_to_job(r) for r in rows]
+
+    def cancel(self, job_id):
+        """Queued jobs are dropped at once; running ones stop at their next progress update (after the render, if rendering)."""
+        with _connect(self.db_path) as conn:
+            conn.execute("UPDATE jobs SET status = 'cancelled', message = 'Cancelled', updated = ? WHERE id = ? AND status = 'queued'", (time.time(), job_id))
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+
+    def queue_depth(self):
+        with _connect(self.db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def profile_stats(self):
+        """Mean encode fps and output size per encoder profile, over finished jobs."""
+        stats = {}
+        with _connect(self.db_path) as conn:
+            rows = conn.execute("SELECT result FROM jobs WHERE status = 'done'").fetchall()
+        for row in rows:
+            encode = json.loads(row["result"]).get("encode")
+            if not encode or not encode.get("encode_fps"):
+                continue
+            entry = stats.setdefault(encode["profile"], {"jobs": 0, "encode_fps": 0.0, "output_mb": 0.0})
+            entry["jobs"] += 1
+            entry["encode_fps"] += encode["encode_fps"]
+            entry["output_mb"] += (encode["output_bytes"] or 0) / 1024 / 1024
+        for entry in stats.values():
+            entry["encode_fps"] = round(entry["encode_fps"] / entry["jobs"], 1)
+            entry["output_mb"] = round(entry["output_mb"] / entry["jobs"], 2)
+        return stats
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_warm_worker)
+
+    def _start(self, job_id, secrets, profile):
+        """Hands a claimed job to the pool. A job that cannot be started goes back to the queue."""
+        try:
+            try:
+                return self._pool.submit(_run_job, self.db_path, self.jobs_dir, job_id, secrets, profile)
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory) and took the pool with it; start a fresh one
+                self._pool.shutdown(wait=False)
+                self._pool = self._new_pool()
+                return self._pool.submit(_run_job, self.db_path, self.jobs_dir, job_id, secrets, profile)
+        except Exception as e:
+            print(f"Job dispatch failed: {e}")
+            with self._lock:
+                self._in_flight -= 1
+            with _connect(self.db_path) as conn:
+                conn.execute("UPDATE jobs SET status = 'queued', message = 'Queued', updated = ? WHERE id = ?", (time.time(), job_id))
+            return None
+
+    def _claim_next(self):
+        with _connect(self.db_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+            if row:
+                conn.execute("UPDATE jobs SET status = 'running', message = 'Starting...', updated = ? WHERE id = ?", (time.time(), row["id"]))
+            conn.execute("COMMIT")
+        return row["id"] if row else None
+
+    def _finished(self, job_id, future):
+        with self._lock:
+            self._in_flight -= 1
+        self._secrets.pop(job_id, None)
+        if future.exception():
+            # The worker process itself died (e.g. out of memory)
+            with _connect(self.db_path) as conn:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ?",
+                    (f"Worker crashed: {future.exception()}", time.time(), job_id),
+                )
+        self._wakeup.set()
+
+    def _dispatch_loop(self):
+        while True:
+            self._wakeup.wait(POLL_INTERVAL)
+            self._wakeup.clear()
+            while True:
+                with self._lock:
+                    if self._in_flight >= self.workers:
+                        break
+                job_id = self._claim_next()
+                if not job_id:
+                    break
+                secrets = self._secrets.get(job_id) or {k: os.environ.get(k, "") for k in ("GEMINI_API_KEY", "GROQ_API_KEY", "PEXELS_API_KEY")}
+                with self._lock:
+                    self._in_flight += 1
+                # Decided at start time: drop to a faster profile while others wait, compress harder when idle
+                profile = video.select_profile(self.queue_depth())
+                future = self._start(job_id, secrets, profile)
+                if future is None:
+                    break # Retried at the next poll
+                future.add_done_callback(lambda f, job_id=job_id: self._finished(job_id, f))
@@ -0,0 +1,32 @@
+import importlib
+
+# Heavy third-party modules (moviepy, google.generativeai, trafilatura, edge_tts...) are only
+# needed once a stage actually runs; importing them up front slows every rerun and worker spawn.
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            module = importlib.import_module(self._name)
+            object.__setattr__(self, "_module", module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        # Monkeypatching (e.g. the benchmark's fake edge_tts.Communicate) lands on the real module
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+def module(name):
+    return LazyModule(name)
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import threading
+import itertools
+import contextlib
+import contextvars
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+# Stage/segment spans: wall time, bytes transferred, peak RSS, plus free-form attributes
+_current = contextvars.ContextVar("metrics_span", default=None)
+_ids = itertools.count(1)
+
+def peak_rss_mb(who="self"):
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(usage.ru_maxrss / scale, 1)
+
+class Span:
+    def __init__(self, name, parent, attrs):
+        self.id = next(_ids)
+        self.name = name
+        self.parent = parent
+        self.parent_id = parent.id if parent else None
+        self.attrs = dict(attrs)
+        self.bytes = 0
+        self.thread_id = threading.get_ident()
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.wall = None
+
+    def add_bytes(self, n):
+        # Count towards every enclosing span so stage totals include their children
+        span = self
+        while span is not None:
+            span.bytes += n
+            span = span.parent
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        self.wall = time.perf_counter() - self._t0
+        self.attrs["peak_rss_mb"] = peak_rss_mb()
+        self.attrs["children_peak_rss_mb"] = peak_rss_mb("children")
+
+    @classmethod
+    def from_dict(cls, row):
+        """A finished span rebuilt from to_dict() output, e.g. one recorded in another process."""
+        row = dict(row)
+        span = cls(row.pop("name"), None, {})
+        span.id, span.parent_id = row.pop("id"), row.pop("parent_id")
+        span.start, span.wall, span.bytes = row.pop("start"), row.pop("wall_s"), row.pop("bytes")
+        span.attrs = row
+        return span
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "wall_s": round(self.wall, 4) if self.wall is not None else None,
+            "bytes": self.bytes,
+            **self.attrs,
+        }
+
+class Recorder:
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def reset(self, keep=()):
+        """Drops recorded spans, except those whose name is in keep."""
+        with self._lock:
+            self.spans = [s for s in self.spans if s.name in keep]
+
+    def to_dicts(self):
+        with self._lock:
+            return [s.to_dict() for s in sorted(self.spans, key=lambda s: s.start)]
+
+    def export_jsonl(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for row in self.to_dicts():
+                f.write(json.dumps(row) + "\n")
+
+    def export_chrome_trace(self, path):
+        """Writes a trace loadable in chrome://tracing or Perfetto."""
+        with self._lock:
+            spans = list(self.spans)
+        events = [{
+            "name": s.name,
+            "ph": "X",
+            "ts": int(s.start * 1e6),
+            "dur": int((s.wall or 0) * 1e6),
+            "pid": os.getpid(),
+            "tid": s.thread_id,
+            "args": dict(s.attrs, bytes=s.bytes),
+        } for s in spans]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def summary(self):
+        """One row per span name, in order of first appearance."""
+        rows = {}
+        for s in self.to_dicts():
+            row = rows.setdefault(s["name"], {"stage": s["name"], "count": 0, "wall_s": 0.0, "max_s": 0.0, "bytes": 0, "peak_rss_mb": None})
+            row["count"] += 1
+            row["wall_s"] = round(row["wall_s"] + (s["wall_s"] or 0), 3)
+            row["max_s"] = max(row["max_s"], s["wall_s"] or 0)
+            row["bytes"] += s["bytes"]
+            if s.get("peak_rss_mb") is not None:
+                row["peak_rss_mb"] = max(row["peak_rss_mb"] or 0, s["peak_rss_mb"])
+            if "encode_fps" in s:
+                row["encode_fps"] = s["encode_fps"]
+        return list(rows.values())
+
+    def summary_markdown(self):
+        lines = ["| Stage | Count | Wall (s) | Max (s) | Bytes | Peak RSS (MB) | Encode fps |", "|---|---|---|---|---|---|---|"]
+        for row in self.summary():
+            lines.append(
+                f"| {row['stage']} | {row['count']} | {row['wall_s']} | {row['max_s']} | {row['bytes']} "
+                f"| {row['peak_rss_mb']} | {row.get('encode_fps', '')} |"
+            )
+        return "\n".join(lines)
+
+recorder = Recorder()
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    s = Span(name, _current.get(), attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.set(error=repr(e))
+        raise
+    finally:
+        s.finish()
+        _current.reset(token)
+        recorder.record(s)
+
+def add_bytes(n):
+    s = _current.get()
+    if s is not None:
+        s.add_bytes(n)
@@ -0,0 +1,113 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+# Shared HTTP layer: one keep-alive session per host, timeouts and retries on every call
+DEFAULT_TIMEOUT = (5, 30)  # (connect, read) seconds
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 20.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+POOL_SIZE = 10
+
+_sessions = {}
+_stats = {}
+_lock = threading.Lock()
+
+def _session(host):
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[host] = session
+    return session
+
+def _host_stats(host):
+    if host not in _stats:
+        _stats[host] = {"requests": 0, "retries": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+    return _stats[host]
+
+def _record(host, started, error=False, retry=False):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _lock:
+        s = _host_stats(host)
+        s["requests"] += 1
+        s["total_ms"] += elapsed_ms
+        s["max_ms"] = max(s["max_ms"], elapsed_ms)
+        if error:
+            s["errors"] += 1
+        if retry:
+            s["retries"] += 1
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, or the server's Retry-After when it sent one."""
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def request(method, url, retries=MAX_RETRIES, timeout=DEFAULT_TIMEOUT, **kwargs):
+    host = urlsplit(url).netloc
+    session = _session(host)
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        last = attempt == retries
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            _record(host, started, error=True, retry=not last)
+            if last:
+                raise
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUSES and not last:
+            _record(host, started, error=True, retry=True)
+            delay = backoff_delay(attempt, _retry_after(response))
+            response.close()
+            time.sleep(delay)
+            continue
+
+        _record(host, started, error=response.status_code >= 400)
+        if not kwargs.get("stream"):
+            metrics.add_bytes(len(response.content))
+        return response
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def head(url, **kwargs):
+    return request("HEAD", url, **kwargs)
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+def stats():
+    """Per-host request, retry and error counters with latency in milliseconds."""
+    with _lock:
+        result = {}
+        for host, s in _stats.items():
+            result[host] = dict(s, avg_ms=round(s["total_ms"] / s["requests"], 1) if s["requests"] else 0.0)
+        return result
@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import glob
+import hashlib
+import argparse
+
+from . import ingestion, synthesis, assets, audio, video, metrics
+
+# Incremental replacement for the notebook stages in dvc.yaml:
+#   python -m src.pipeline ingest|script|assets|render|all
+# Outputs keep the notebook layout (data/raw_news.json, data/script.json, assets/, final_video.mp4).
+# Every stage records content hashes of what it consumed and skips work whose inputs are unchanged;
+# the asset stage does so per segment and per part (voiceover / visual).
+DATA_DIR = "data"
+RAW_NEWS = os.path.join(DATA_DIR, "raw_news.json")
+SCRIPT_FILE = os.path.join(DATA_DIR, "script.json")
+ASSETS_DIR = "assets"
+FINAL_VIDEO = "final_video.mp4"
+STATE_FILE = os.path.join(DATA_DIR, "pipeline_state.json")
+MANIFEST = "manifest.json" # inside ASSETS_DIR, so it travels with the assets output
+# Render intermediates (segment encodes, caption overlays, the soundtrack): kept between runs but out of
+# ASSETS_DIR, which is a tracked DVC output
+RENDER_DIR = os.path.join(".cache", "render")
+
+STAGES = ("ingest", "script", "assets", "render")
+
+def digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+def _load_json(path, default=None):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def _write_json(path, value):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(value, f, indent=4, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _state():
+    return _load_json(STATE_FILE, {})
+
+def _save_state(stage, key):
+    state = _state()
+    state[stage] = key
+    _write_json(STATE_FILE, state)
+
+def _up_to_date(stage, key, *outputs):
+    return _state().get(stage) == key and all(os.path.exists(p) for p in outputs)
+
+def run_ingest(topic, force=False):
+    # Always fetches (the feed is the input); the conditional GET makes an unchanged feed cheap
+    news = ingestion.fetch_news_topic(topic)
+    if not news:
+        print("No news found.")
+        return False
+    data = [news]
+    if not force and _load_json(RAW_NEWS) == data:
+        print("ingest: unchanged")
+        return True
+    _write_json(RAW_NEWS, data)
+    print(f"ingest: saved {news['title']}")
+    return True
+
+def run_script(force=False):
+    news_data = _load_json(RAW_NEWS, [])
+    if not news_data:
+        print(f"No raw news found in {RAW_NEWS}")
+        return False
+    item = news_data[0]
+    key = digest([item, synthesis.GEMINI_MODEL, synthesis.GROQ_MODEL, synthesis.GEMINI_PROMPT, synthesis.GROQ_USER_PROMPT])
+    if not force and _up_to_date("script", key, SCRIPT_FILE):
+        print("script: up to date")
+        return True
+
+    script = synthesis.generate_script(item, gemini_key=os.environ.get("GEMINI_API_KEY"), groq_key=os.environ.get("GROQ_API_KEY"))
+    if not script:
+        print("script: generation failed")
+        return False
+    _write_json(SCRIPT_FILE, [script])
+    _save_state("script", key)
+    return True
+
+def _part_keys(seg, pexels):
+    return {
+        "audio": digest(["audio", assets.DEFAULT_VOICE, seg.get("text", "")]),
+        "visual": digest(["visual", seg.get("image_prompt", ""), pexels]),
+    }
+
+def _has_part(i, part):
+    if part == "audio":
+        return os.path.exists(os.path.join(ASSETS_DIR, f"{i}_audio.mp3"))
+    return any(os.path.exists(os.path.join(ASSETS_DIR, f"{i}_visual{ext}")) for ext in (".mp4", ".jpg"))
+
+def _remove_stale(count):
+    # Segments the script no longer has
+    for path in glob.glob(os.path.join(ASSETS_DIR, "*_audio.mp3")) + glob.glob(os.path.join(ASSETS_DIR, "*_visual.*")):
+        index = os.path.basename(path).split("_", 1)[0]
+        if index.isdigit() and int(index) >= count:
+            os.remove(path)
+
+def run_assets(force=False):
+    scripts = _load_json(SCRIPT_FILE, [])
+    if not scripts:
+        print(f"No script found in {SCRIPT_FILE}")
+        return False
+    segments = scripts[0].get("segments", [])
+    pexels_key = os.environ.get("PEXELS_API_KEY")
+    manifest_path = os.path.join(ASSETS_DIR, MANIFEST)
+    manifest = {} if force else _load_json(manifest_path, {})
+    previous = manifest.get("segments", {})
+
+    plan, keys = {}, {}
+    for i, seg in enumerate(segments):
+        keys[i] = _part_keys(seg, bool(pexels_key))
+        done = previous.get(str(i), {})
+        parts = tuple(part for part in ("audio", "visual") if done.get(part) != keys[i][part] or not _has_part(i, part))
+        if parts:
+            plan[i] = parts
+    print(f"assets: {sum(len(p) for p in plan.values())} of {len(segments) * 2} parts to generate")
+
+    results = assets.generate_assets(
+        segments,
+        ASSETS_DIR,
+        pexels_key=pexels_key,
+        progress_callback=lambda done, total, message: print(f"[{done}/{total}] {message}"),
+        plan=plan,
+    ) if plan else []
+    _remove_stale(len(segments))
+
+    # Only record parts that succeeded, so failures are retried next run
+    entries = {}
+    for i in range(len(segments)):
+        entry = dict(previous.get(str(i), {}))
+        if i in plan:
+            result = results[i] or {}
+            for part in plan[i]:
+                ok = result.get("audio") if part == "audio" else result.get("visual")
+                if ok:
+                    entry[part] = keys[i][part]
+                else:
+                    entry.pop(part, None)
+        entries[str(i)] = entry
+    _write_json(manifest_path, {"segments": entries})
+    return all(len(entries[str(i)]) == 2 for i in range(len(segments)))
+
+def run_render(backend="parallel", motion=video.DEFAULT_MOTION, profile=video.DEFAULT_PROFILE, force=False):
+    scripts = _load_json(SCRIPT_FILE, [])
+    if not scripts:
+        print(f"No script found in {SCRIPT_FILE}")
+        return False
+    script = scripts[0]
+    manifest = _load_json(os.path.join(ASSETS_DIR, MANIFEST), {})
+    music = audio.select_track(script.get("music_mood"))
+    key = digest([
+        script, manifest, backend, motion, video.ENCODER_PROFILES[profile], video.SEGMENT_RENDER_VERSION,
+        audio.AUDIO_STAGE_VERSION, music and audio.file_digest(music),
+    ])
+    if not force and _up_to_date("render", key, FINAL_VIDEO):
+        print("render: up to date")
+        return True
+    # The parallel backend also reuses every unchanged segment's encode from RENDER_DIR/segments/
+    if not video.make_video(script, ASSETS_DIR, FINAL_VIDEO, backend=backend, motion=motion, profile=profile, work_dir=RENDER_DIR):
+        return False
+    _save_state("render", key)
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run pipeline stages incrementally.")
+    parser.add_argument("stage", choices=STAGES + ("all",))
+    parser.add_argument("--topic", default="Technology", help="news topic for the ingest stage")
+    parser.add_argument("--backend", default="parallel", choices=video.RENDER_BACKENDS)
+    parser.add_argument("--motion", default=video.DEFAULT_MOTION, choices=list(video.MOTION_PRESETS), help="camera move for still-image segments")
+    parser.add_argument("--profile", default=video.DEFAULT_PROFILE, choices=list(video.ENCODER_PROFILES), help="encoder profile for the render stage")
+    parser.add_argument("--force", action="store_true", help="ignore recorded hashes and redo the stage")
+    args = parser.parse_args(argv)
+
+    stages = STAGES if args.stage == "all" else (args.stage,)
+    runners = {
+        "ingest": lambda: run_ingest(args.topic, args.force),
+        "script": lambda: run_script(args.force),
+        "assets": lambda: run_assets(args.force),
+        "render": lambda: run_render(args.backend, args.motion, args.profile, args.force),
+    }
+    for stage in stages:
+        with metrics.span(f"pipeline.{stage}"):
+            ok = runners[stage]()
+        if not ok:
+            print(f"Stage '{stage}' failed.")
+            return 1
+    print(metrics.recorder.summary_markdown())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,35 @@
-
 import os
+import re
 import json
 import time
-import google.generativeai as genai
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-import requests
+from . import lazy, metrics, net
+from .cache import AssetCache
 
-def generate_script_groq(news_item, api_key):
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    system_prompt = """
-    You are a viral video producer. Transform the provided news into a 30-60 second engaging video script.
+genai = lazy.module("google.generativeai")
+
+GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GEMINI_MODEL = "gemini-2.0-flash"
+GROQ_MODEL = "llama-3.3-70b-versatile" # Valid Groq model
+GEMINI_ATTEMPTS = 3
+CONTENT_CHARS = 2000
+
+# Scripts are small JSON blobs; they get their own store so media never evicts them
+SCRIPT_CACHE_DIR = os.environ.get("SCRIPT_CACHE_DIR", os.path.join(".cache", "scripts"))
+SCRIPT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+REQUIREMENTS = """
+    Requirements:
+    1. Create 5 to 7 segments. Engaging, hype, but factual.
+    2. For each segment, provide a visual prompt for an AI image generator (Pollinations.ai).
+    3. Visual prompts should be descriptive, cinematic, and simple.
+"""
+
+SCHEMA = """
     Output strictly valid JSON with this schema:
     {
       "music_mood": "string",
@@ -23,29 +38,179 @@ def generate_script_groq(news_item, api_key):
         ...
       ]
     }
-    """
-    
-    user_prompt = f"""
-    News Title: {news_item['title']}
-    Content: {news_item['content'][:2000]} ...
+"""
+
+GEMINI_PROMPT = """
+    You are a viral video producer. Transform the following news into a 30-60 second engaging video script.
+    News Title: {title}
+    Content: {content} ...
+""" + REQUIREMENTS + SCHEMA
+
+GROQ_SYSTEM_PROMPT = """
+    You are a viral video producer. Transform the provided news into a 30-60 second engaging video script.
+""" + SCHEMA
+
+GROQ_USER_PROMPT = """
+    News Title: {title}
+    Content: {content} ...
+""" + REQUIREMENTS
+
+# Routing: fastest healthy provider first, hedge to the next one once the first runs past its p95
+ROUTER_WINDOW = 50 # calls remembered per provider
+HEDGE_DEFAULT_S = 8.0 # deadline before a provider has enough history
+HEDGE_MIN_S = 1.0
+UNHEALTHY_ERROR_RATE = 0.5
+
+# Batched scripting: several articles per request, one script each
+BATCH_SIZE = 4
+BATCH_RETRIES = 1
+
+BATCH_PROMPT = """
+    You are a viral video producer. Transform EACH of the following news articles into its own
+    30-60 second engaging video script.
+""" + REQUIREMENTS + """
+    Output strictly valid JSON with this schema, one entry per article, echoing its id:
+    {
+      "scripts": [
+        {"id": 0, "music_mood": "string", "segments": [{"text": "Voiceover sentence here", "image_prompt": "Cinematic shot of ..."}, ...]},
+        ...
+      ]
+    }
+
+    Articles:
+"""
+
+BATCH_ARTICLE = """
+    Article {id}:
+    News Title: {title}
+    Content: {content} ...
+"""
+
+_script_cache = None
+_cache_lock = threading.Lock()
+_inflight = {}
+_inflight_lock = threading.Lock()
+_coalesced = 0
+
+_gemini_lock = threading.Lock()
+_gemini_key = None
+_gemini_models = {}
+
+class ProviderRouter:
+    """Rolling latency and error rate per provider, used to order and hedge script requests."""
+
+    def __init__(self, window=ROUTER_WINDOW):
+        self.window = window
+        self.hedges = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider, latency, ok):
+        with self._lock:
+            self._calls.setdefault(provider, deque(maxlen=self.window)).append((latency, ok))
+
+    def _latencies(self, provider):
+        return sorted(latency for latency, ok in self._calls.get(provider, ()) if ok)
+
+    def error_rate(self, provider):
+        with self._lock:
+            calls = self._calls.get(provider, ())
+            return sum(not ok for _, ok in calls) / len(calls) if calls else 0.0
+
+    def percentile(self, provider, q):
+        with self._lock:
+            latencies = self._latencies(provider)
+        if len(latencies) < 5:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def order(self, providers):
+        # Healthy before unhealthy, then by median latency; providers without history keep their place
+        def rank(item):
+            position, provider = item
+            p50 = self.percentile(provider, 0.5)
+            return (self.error_rate(provider) >= UNHEALTHY_ERROR_RATE, p50 if p50 is not None else HEDGE_DEFAULT_S, position)
+        return [p for _, p in sorted(enumerate(providers), key=rank)]
+
+    def deadline(self, provider):
+        p95 = self.percentile(provider, 0.95)
+        return max(HEDGE_MIN_S, p95) if p95 is not None else HEDGE_DEFAULT_S
+
+    def stats(self):
+        with self._lock:
+            providers = list(self._calls)
+        result = {}
+        for provider in providers:
+            with self._lock:
+                calls = len(self._calls[provider])
+            result[provider] = {
+                "calls": calls,
+                "error_rate": round(self.error_rate(provider), 3),
+                "p50_s": self.percentile(provider, 0.5),
+                "p95_s": self.percentile(provider, 0.95),
+            }
+        return dict(result, hedges=self.hedges)
+
+router = ProviderRouter()
+# Multi-article requests take several times longer than one script; they get their own history so
+# they do not skew single-script ordering or the hedge deadline
+batch_router = ProviderRouter()
+_hedge_pool = ThreadPoolExecutor(8, thread_name_prefix="synthesis")
+
+def get_script_cache():
+    global _script_cache
+    with _cache_lock:
+        if _script_cache is None:
+            _script_cache = AssetCache(SCRIPT_CACHE_DIR, SCRIPT_CACHE_MAX_BYTES)
+    return _script_cache
+
+def set_script_cache(cache):
+    global _script_cache
+    with _cache_lock:
+        _script_cache = cache
+
+def cache_stats():
+    return dict(get_script_cache().stats(), coalesced=_coalesced)
+
+def script_key(provider, model, news_item):
+    template = GEMINI_PROMPT if provider == "gemini" else GROQ_SYSTEM_PROMPT + GROQ_USER_PROMPT
+    return AssetCache.key("script", provider, model, template, news_item["title"], news_item["content"][:CONTENT_CHARS])
+
+def _fill(template, news_item):
+    # Not str.format: the JSON schema in the templates is full of braces
+    return template.replace("{title}", news_item['title']).replace("{content}", news_item['content'][:CONTENT_CHARS])
+
+def _gemini_model(api_key, model_name=GEMINI_MODEL):
+    # genai.configure sets process-wide state; only redo it when the key changes
+    global _gemini_key
+    with _gemini_lock:
+        if api_key != _gemini_key:
+            genai.configure(api_key=api_key)
+            _gemini_key = api_key
+            _gemini_models.clear()
+        if model_name not in _gemini_models:
+            _gemini_models[model_name] = genai.GenerativeModel(model_name)
+        return _gemini_models[model_name]
+
+def generate_script_groq(news_item, api_key):
+    url = GROQ_API_URL
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    user_prompt = _fill(GROQ_USER_PROMPT, news_item)
 
-    Requirements:
-    1. Create 5 to 7 segments. Engaging, hype, but factual.
-    2. For each segment, provide a visual prompt for an AI image generator (Pollinations.ai).
-    3. Visual prompts should be descriptive, cinematic, and simple.
-    """
-    
     data = {
-        "model": "llama-3.3-70b-versatile", # Valid Groq model
+        "model": GROQ_MODEL,
         "messages": [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": GROQ_SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt}
         ],
         "response_format": {"type": "json_object"}
     }
-    
+
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = net.post(url, headers=headers, json=data, timeout=(5, 60))
         response.raise_for_status()
         result = response.json()
         content = result['choices'][0]['message']['content']
@@ -54,53 +219,429 @@ def generate_script_groq(news_item, api_key):
         print(f"Groq Synthesis failed: {e}")
         return None
 
-def generate_script(news_item, gemini_key=None, groq_key=None):
-    # Try Gemini first if key is provided
+def generate_script_gemini(news_item, api_key, span=None):
+    model = _gemini_model(api_key)
+    prompt = _fill(GEMINI_PROMPT, news_item)
+
+    for attempt in range(GEMINI_ATTEMPTS):
+        try:
+            response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
+            # Clean cleanup if markdown code block is returned (sometimes happens despite mime_type)
+            text = response.text.replace("```json", "").replace("```", "")
+            result = json.loads(text)
+            print("Gemini Success.")
+            if span:
+                span.set(attempts=attempt + 1)
+            return result
+        except Exception as e:
+            print(f"Gemini attempt {attempt+1} failed: {e}")
+            if attempt + 1 < GEMINI_ATTEMPTS:
+                time.sleep(net.backoff_delay(attempt))
+    return None
+
+def generate_script(news_item, gemini_key=None, groq_key=None, use_cache=True):
+    with metrics.span("synthesis") as span:
+        script = _generate_script_cached(news_item, gemini_key, groq_key, span, use_cache)
+        span.set(segments=len(script.get("segments", [])) if script else 0)
+        return script
+
+def _generate_script_cached(news_item, gemini_key, groq_key, span, use_cache):
+    global _coalesced
+    providers = [p for p, key in (("gemini", gemini_key), ("groq", groq_key)) if key]
+    keys = {"gemini": script_key("gemini", GEMINI_MODEL, news_item), "groq": script_key("groq", GROQ_MODEL, news_item)}
+    if use_cache:
+        cache = get_script_cache()
+        for provider in providers:
+            script = cache.get_json(keys[provider])
+            if valid_script(script): # entries cached before image_prompt was required are regenerated
+                span.set(provider=provider, cached=True)
+                return script
+
+    # Coalesce identical requests already in flight: one caller does the work, the rest wait for it
+    flight = tuple(keys[p] for p in providers)
+    with _inflight_lock:
+        leader = flight not in _inflight
+        if leader:
+            _inflight[flight] = Future()
+        else:
+            _coalesced += 1
+        future = _inflight[flight]
+    if not leader:
+        span.set(coalesced=True)
+        return future.result()
+
+    script = None
+    try:
+        script, provider = _generate_script(news_item, gemini_key, groq_key, span)
+        if script and use_cache:
+            get_script_cache().put_json(keys[provider], script)
+    finally:
+        with _inflight_lock:
+            del _inflight[flight]
+        future.set_result(script)
+    return script
+
+def valid_segment(seg):
+    # The asset stage needs both: the text for the voiceover, the image_prompt for the visual
+    return isinstance(seg, dict) and all(isinstance(seg.get(k), str) and seg[k].strip() for k in ("text", "image_prompt"))
+
+def valid_script(script):
+    return isinstance(script, dict) and isinstance(script.get("segments"), list) and bool(script["segments"]) \
+        and all(valid_segment(seg) for seg in script["segments"])
+
+def _timed_call(provider, func, *args):
+    started = time.perf_counter()
+    result = None
+    try:
+        result = func(*args)
+    finally:
+        ok = valid_script(result)
+        router.record(provider, time.perf_counter() - started, ok)
+    return result if ok else None
+
+def _generate_script(news_item, gemini_key, groq_key, span):
+    calls = {}
     if gemini_key:
-        print(f"Attempting Gemini generation...")
-        args = {"api_key": gemini_key}
-        genai.configure(**args)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        
-        prompt = f"""
-        You are a viral video producer. Transform the following news into a 30-60 second engaging video script.
-        News Title: {news_item['title']}
-        Content: {news_item['content'][:2000]} ...
-    
-        Requirements:
-        1. Create 5 to 7 segments. Engaging, hype, but factual.
-        2. For each segment, provide a visual prompt for an AI image generator (Pollinations.ai).
-        3. Visual prompts should be descriptive, cinematic, and simple.
-        
-        Output strictly valid JSON with this schema:
-        {{
-          "music_mood": "string",
-          "segments": [
-            {{"text": "Voiceover sentence here", "image_prompt": "Cinematic shot of ..."}},
-            ...
-          ]
-        }}
-        """
-        
-        for attempt in range(3):
+        calls["gemini"] = lambda: generate_script_gemini(news_item, gemini_key, span)
+    if groq_key:
+        calls["groq"] = lambda: generate_script_groq(news_item, groq_key)
+    order = router.order(list(calls))
+    if not order:
+        return None, None
+
+    # Start with the best provider. Fire the next one when the current one fails or
+    # outlives its p95; the first valid script wins and stragglers are left to finish
+    pending = {}
+    next_provider = iter(order)
+
+    def launch():
+        provider = next(next_provider, None)
+        if provider:
+            print(f"Attempting {provider} generation...")
+            future = _hedge_pool.submit(contextvars.copy_context().run, _timed_call, provider, calls[provider])
+            pending[future] = (provider, time.perf_counter() + router.deadline(provider))
+        return provider
+
+    launch()
+    hedged = False
+    while pending:
+        deadline = min(deadline for _, deadline in pending.values())
+        # Past every deadline only completion is left to wait for; wait() cannot take an infinite timeout
+        timeout = max(0.0, deadline - time.perf_counter()) if deadline != float("inf") else None
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            provider, _ = pending.pop(future)
             try:
-                 response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-                 # Clean cleanup if markdown code block is returned (sometimes happens despite mime_type)
-                 text = response.text.replace("```json", "").replace("```", "")
-                 print("Gemini Success.")
-                 return json.loads(text)
+                result = future.result()
             except Exception as e:
-                 print(f"Gemini attempt {attempt+1} failed: {e}")
-                 time.sleep(2)
-        
-        print("Gemini failed after retries.")
+                print(f"{provider} failed: {e}")
+                result = None
+            if result:
+                print(f"{provider} Success.")
+                span.set(provider=provider, hedged=hedged)
+                return result, provider
+            print(f"{provider} failed.")
+            launch()
+        if not done:
+            # Deadline passed with nothing back: hedge, and stop timing out on this one
+            for future, (provider, _) in list(pending.items()):
+                pending[future] = (provider, float("inf"))
+            if launch():
+                hedged = True
+                router.hedges += 1
+                span.set(hedge_after=provider)
 
-    # Fallback to Groq
-    if groq_key:
-        print("Falling back to Groq...")
-        result = generate_script_groq(news_item, groq_key)
-        if result:
-            print("Groq Success.")
-            return result
-             
-    return None
+    return None, None
+
+class SegmentStreamParser:
+    """
+    Incremental parser for a script arriving token by token. feed() returns the segments
+    whose JSON object closed in that chunk; result() parses the whole document at the end.
+    """
+    _MOOD = re.compile(r'"music_mood"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+    def __init__(self):
+        self.buffer = ""
+        self.segments = []
+        self.closed = False # the segments array has ended
+        self._pos = None # scan position inside the segments array
+        self._in_string = False
+        self._escape = False
+        self._depth = 0
+        self._start = None
+
+    def feed(self, text):
+        self.buffer += text
+        if self._pos is None:
+            key = self.buffer.find('"segments"')
+            bracket = self.buffer.find("[", key) if key != -1 else -1
+            if bracket == -1:
+                return []
+            self._pos = bracket + 1
+
+        found = []
+        buf = self.buffer
+        while self._pos < len(buf) and not self.closed:
+            ch = buf[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = self._pos
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        seg = json.loads(buf[self._start:self._pos + 1])
+                    except ValueError:
+                        seg = None
+                    if valid_segment(seg):
+                        self.segments.append(seg)
+                        found.append(seg)
+            elif ch == "]" and self._depth == 0:
+                self.closed = True
+            self._pos += 1
+        return found
+
+    @property
+    def music_mood(self):
+        match = self._MOOD.search(self.buffer)
+        return json.loads(f'"{match.group(1)}"') if match else None
+
+    def result(self):
+        text = self.buffer.replace("```json", "").replace("```", "")
+        try:
+            script = json.loads(text)
+        except ValueError:
+            script = None
+        if valid_script(script):
+            return script
+        if self.closed and self.segments:
+            return {"music_mood": self.music_mood or "", "segments": list(self.segments)}
+        return None
+
+def stream_script_groq(news_item, api_key):
+    """Yields the script JSON text as Groq generates it (server-sent events)."""
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "model": GROQ_MODEL,
+        "messages": [
+            {"role": "system", "content": GROQ_SYSTEM_PROMPT},
+            {"role": "user", "content": _fill(GROQ_USER_PROMPT, news_item)}
+        ],
+        "response_format": {"type": "json_object"},
+        "stream": True
+    }
+    response = net.post(GROQ_API_URL, headers=headers, json=data, timeout=(5, 60), stream=True)
+    with response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == "[DONE]":
+                break
+            metrics.add_bytes(len(line))
+            delta = json.loads(payload)["choices"][0].get("delta", {})
+            if delta.get("content"):
+                yield delta["content"]
+
+def stream_script_gemini(news_item, api_key):
+    """Yields the script JSON text as Gemini generates it."""
+    model = _gemini_model(api_key)
+    response = model.generate_content(
+        _fill(GEMINI_PROMPT, news_item),
+        generation_config={"response_mime_type": "application/json"},
+        stream=True,
+    )
+    for chunk in response:
+        if chunk.text:
+            yield chunk.text
+
+def generate_script_stream(news_item, gemini_key=None, groq_key=None, on_segment=None, use_cache=True):
+    """
+    Like generate_script, but calls on_segment(index, segment) as soon as each segment is
+    complete, so asset work can overlap generation. Providers are tried in router order
+    without hedging (a hedge would emit segments twice). If a stream breaks after segments
+    were emitted, the script is cut to those segments rather than started over. The returned
+    script's segments are always exactly the emitted ones.
+    """
+    with metrics.span("synthesis", streaming=True) as span:
+        emitted = []
+
+        def emit(seg):
+            emitted.append(seg)
+            if on_segment:
+                on_segment(len(emitted) - 1, seg)
+
+        streams = {}
+        if gemini_key:
+            streams["gemini"] = lambda: stream_script_gemini(news_item, gemini_key)
+        if groq_key:
+            streams["groq"] = lambda: stream_script_groq(news_item, groq_key)
+        keys = {"gemini": script_key("gemini", GEMINI_MODEL, news_item), "groq": script_key("groq", GROQ_MODEL, news_item)}
+
+        if use_cache:
+            for provider in streams:
+                script = get_script_cache().get_json(keys[provider])
+                if valid_script(script):
+                    for seg in script.get("segments", []):
+                        emit(seg)
+                    span.set(provider=provider, cached=True, segments=len(emitted))
+                    return script
+
+        for provider in router.order(list(streams)):
+            print(f"Streaming {provider} generation...")
+            parser = SegmentStreamParser()
+            started = time.perf_counter()
+            error = None
+            chunks = iter(streams[provider]())
+            while True:
+                # Provider errors end this attempt; errors raised by on_segment propagate
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    error = e
+                    break
+                for seg in parser.feed(chunk):
+                    if not emitted:
+                        span.set(first_segment_s=round(time.perf_counter() - started, 3))
+                    emit(seg)
+
+            script = None if error else parser.result()
+            router.record(provider, time.perf_counter() - started, script is not None)
+            if script:
+                # Anything the incremental parser missed still goes out, in order
+                if script["segments"][:len(emitted)] == emitted:
+                    for seg in script["segments"][len(emitted):]:
+                        emit(seg)
+                script = dict(script, segments=list(emitted))
+                if use_cache:
+                    get_script_cache().put_json(keys[provider], script)
+                span.set(provider=provider, segments=len(emitted))
+                print(f"{provider} Success.")
+                return script
+
+            print(f"{provider} stream failed: {error or 'invalid script'}")
+            if emitted:
+                span.set(provider=provider, partial=True, segments=len(emitted))
+                return {"music_mood": parser.music_mood or "", "segments": list(emitted)}
+
+        span.set(segments=0)
+        return None
+
+def batch_key(provider, model, news_item):
+    return AssetCache.key("script-batch", provider, model, BATCH_PROMPT + BATCH_ARTICLE, news_item["title"], news_item["content"][:CONTENT_CHARS])
+
+def _batch_prompt(news_items):
+    return BATCH_PROMPT + "".join(_fill(BATCH_ARTICLE.replace("{id}", str(n)), item) for n, item in enumerate(news_items))
+
+def _batch_call(provider, api_key, news_items):
+    """One request for several articles; returns the parsed response or None."""
+    prompt = _batch_prompt(news_items)
+    try:
+        if provider == "gemini":
+            response = _gemini_model(api_key).generate_content(prompt, generation_config={"response_mime_type": "application/json"})
+            return json.loads(response.text.replace("```json", "").replace("```", ""))
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": GROQ_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "response_format": {"type": "json_object"}
+        }
+        response = net.post(GROQ_API_URL, headers=headers, json=data, timeout=(5, 120))
+        response.raise_for_status()
+        return json.loads(response.json()['choices'][0]['message']['content'])
+    except Exception as e:
+        print(f"{provider} batch request failed: {e}")
+        return None
+
+def split_batch(response, count):
+    """Scripts from a batch response in article order; None where one is missing or invalid."""
+    scripts = [None] * count
+    entries = response.get("scripts") if isinstance(response, dict) else response
+    if not isinstance(entries, list):
+        return scripts
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            continue
+        n = entry.get("id", position)
+        if isinstance(n, str) and n.isdigit():
+            n = int(n)
+        if isinstance(n, int) and 0 <= n < count and scripts[n] is None:
+            script = {"music_mood": entry.get("music_mood", ""), "segments": entry.get("segments")}
+            if valid_script(script):
+                scripts[n] = script
+    return scripts
+
+def generate_scripts(news_items, gemini_key=None, groq_key=None, batch_size=BATCH_SIZE, retries=BATCH_RETRIES, fallback=True, use_cache=True):
+    """
+    Scripts for many news items, packing up to batch_size articles into each LLM request.
+    Items a response got wrong are retried on their own batch; whatever is still missing
+    falls back to generate_script when `fallback` is set. Returns one script (or None) per item.
+    """
+    keys = {"gemini": gemini_key, "groq": groq_key}
+    models = {"gemini": GEMINI_MODEL, "groq": GROQ_MODEL}
+    providers = [p for p in ("gemini", "groq") if keys[p]]
+    results = [None] * len(news_items)
+
+    with metrics.span("synthesis.batch", items=len(news_items)) as span:
+        pending = []
+        for n, item in enumerate(news_items):
+            if use_cache:
+                for provider in providers:
+                    results[n] = get_script_cache().get_json(batch_key(provider, models[provider], item)) \
+                        or get_script_cache().get_json(script_key(provider, models[provider], item))
+                    if results[n]:
+                        break
+            if not results[n]:
+                pending.append(n)
+        span.set(cached=len(news_items) - len(pending))
+
+        requests_made = 0
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            for attempt in range(retries + 1):
+                if not chunk:
+                    break
+                if attempt:
+                    time.sleep(net.backoff_delay(attempt - 1))
+                for provider in batch_router.order(providers):
+                    started = time.perf_counter()
+                    scripts = split_batch(_batch_call(provider, keys[provider], [news_items[n] for n in chunk]), len(chunk))
+                    requests_made += 1
+                    batch_router.record(provider, time.perf_counter() - started, any(scripts))
+                    for n, script in zip(chunk, scripts):
+                        if script:
+                            results[n] = script
+                            if use_cache:
+                                get_script_cache().put_json(batch_key(provider, models[provider], news_items[n]), script)
+                    chunk = [n for n in chunk if not results[n]]
+                    if any(scripts):
+                        break # retry the leftovers as a smaller batch
+                    print(f"{provider} batch returned nothing usable.")
+
+        missing = [n for n, script in enumerate(results) if not script]
+        if fallback:
+            for n in missing:
+                print(f"Falling back to a single request for item {n}...")
+                results[n] = generate_script(news_items[n], gemini_key, groq_key, use_cache=use_cache)
+        span.set(requests=requests_made, fallbacks=len(missing) if fallback else 0,
+                 failed=sum(not script for script in results))
+    return results
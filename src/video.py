@@ -1,169 +1,704 @@
 
 import os
-from moviepy.editor import *
-import moviepy.video.fx.all as vfx
-from PIL import Image, ImageDraw, ImageFont
-import numpy as np
+import gc
 import textwrap
+import hashlib
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from . import audio, ffmpeg, lazy, metrics
+from .assets import get_audio_duration
 
-# Monkey Patch for Pillow 10+ if needed
-if not hasattr(Image, 'ANTIALIAS'):
-    Image.ANTIALIAS = Image.LANCZOS
+# Loaded on first use: the app imports this module for RENDER_BACKENDS alone
+mpy = lazy.module("moviepy.editor")
+vfx = lazy.module("moviepy.video.fx.all")
+np = lazy.module("numpy")
+Image = lazy.module("PIL.Image")
+ImageDraw = lazy.module("PIL.ImageDraw")
+ImageFont = lazy.module("PIL.ImageFont")
+
+def _patch_pillow():
+    # Monkey Patch for Pillow 10+ if needed (moviepy's resize still uses ANTIALIAS)
+    if not hasattr(Image, 'ANTIALIAS'):
+        Image.ANTIALIAS = Image.LANCZOS
 
 # Optimization Constants
+# Default composite size; a render composes at the size of its largest output instead
 TARGET_W = 720
 TARGET_H = 1280
+FPS = 24
+AUDIO_RATE = audio.AUDIO_RATE
+PADDING = 0.5 # Silence after each voiceover
+FADE = 0.5
+
+RENDER_BACKENDS = ("moviepy", "ffmpeg", "parallel", "streaming")
+
+# Encoder profiles. Frames are composed once at the largest output size and scaled to each `size` by
+# its encoder. threads=0 lets x264 decide; the parallel backend always encodes each segment on one thread.
+ENCODER_PROFILES = {
+    "preview": {"size": (360, 640), "crf": 34, "preset": "superfast", "threads": 2, "audio_bitrate": "64k"},
+    "draft": {"size": (540, 960), "crf": 30, "preset": "superfast", "threads": 2, "audio_bitrate": "96k"},
+    "standard_fast": {"size": (720, 1280), "crf": 25, "preset": "superfast", "threads": 4, "audio_bitrate": "128k"},
+    "standard": {"size": (720, 1280), "crf": 23, "preset": "veryfast", "threads": 4, "audio_bitrate": "128k"},
+    "standard_slow": {"size": (720, 1280), "crf": 21, "preset": "medium", "threads": 4, "audio_bitrate": "128k"},
+    "archive": {"size": (1080, 1920), "crf": 20, "preset": "medium", "threads": 0, "audio_bitrate": "192k"},
+}
+DEFAULT_PROFILE = "standard"
+# Scheduler policy, (minimum queued jobs, profile): the first row that applies wins. The rows keep
+# the resolution and trade only encode time for size, so an auto job's output does not depend on load
+PROFILE_BY_QUEUE_DEPTH = ((4, "standard_fast"), (1, "standard"), (0, "standard_slow"))
+
+# Bump when the segment graph changes so cached per-segment renders are invalidated
+SEGMENT_RENDER_VERSION = 4
+
+# Motion for still-image segments: (zoom, x, y) at the start and end of the segment, interpolated
+# linearly. x and y place the crop window within the free space (0 = left/top, 1 = right/bottom).
+# "parallax" is a single-layer approximation: a push-in with a counter drift.
+MOTION_PRESETS = {
+    "static": ((1.0, 1.0), (0.5, 0.5), (0.5, 0.5)),
+    "zoom_in": ((1.0, 1.15), (0.5, 0.5), (0.5, 0.5)),
+    "pan": ((1.15, 1.15), (0.0, 1.0), (0.5, 0.5)),
+    "parallax": ((1.05, 1.2), (0.8, 0.2), (0.3, 0.6)),
+}
+DEFAULT_MOTION = "zoom_in"
+# Stills are resized once to this multiple of the frame, so per-frame sampling stays smooth
+MOTION_SUPERSAMPLE = 2
+
+# Caption style, in pixels of a CAPTION_REFERENCE_W-wide frame; scaled with the frame
+CAPTION_FONT = "arial.ttf"
+CAPTION_FONT_SIZE = 40
+CAPTION_REFERENCE_W = 720
+
+@functools.lru_cache(maxsize=8)
+def _load_font(font=CAPTION_FONT, size=CAPTION_FONT_SIZE):
+    # Font settings (Default to basic font if custom not found)
+    try:
+        # Try load a clean font usually on Windows
+        return ImageFont.truetype(font, size)
+    except Exception:
+        try:
+            return ImageFont.load_default(size)
+        except TypeError: # Pillow < 10.1 has only the fixed bitmap font
+            return ImageFont.load_default()
+
+# A full-frame RGBA caption is ~3.7 MB; a script only needs a handful at a time
+@functools.lru_cache(maxsize=16)
+def render_caption(text, font=CAPTION_FONT, font_size=CAPTION_FONT_SIZE, size=(TARGET_W, TARGET_H)):
+    """
+    Caption box for a segment as a transparent (H, W, 4) uint8 RGBA array,
+    memoized by (text, font, size). The array is shared, so it is read-only.
+    """
+    width, height = size
+    px = lambda n: round(n * width / CAPTION_REFERENCE_W)
+    overlay = Image.new('RGBA', size, (0,0,0,0))
+    draw = ImageDraw.Draw(overlay)
+    font_obj = _load_font(font, px(font_size))
+
+    # Wrap text - 30 chars fits the 720px frame at 40px
+    wrapper = textwrap.TextWrapper(width=30)
+    lines = wrapper.wrap(text)
+
+    # Draw Box at bottom
+    # Simple estimation: 50px per line
+    text_height = len(lines) * px(50)
+    box_top = height - px(320) # Approx position
+    box_bottom = box_top + text_height + px(40)
+
+    # Semi-transparent background
+    draw.rectangle([(px(35), box_top), (width - px(35), box_bottom)], fill=(0,0,0,160))
+
+    # Draw text
+    y = box_top + px(10)
+    for line in lines:
+        # PIL default font doesn't support getsize well in newer versions, keeping simple
+        draw.text((px(60), y), line, font=font_obj, fill=(255,255,255,255))
+        y += px(50)
+
+    pixels = np.array(overlay)
+    pixels.flags.writeable = False
+    return pixels
+
+def compose_caption(image_path, text, size=(TARGET_W, TARGET_H)):
+    """Image resized to the frame `size` with the caption burned in, as an RGB array."""
+    img = Image.open(image_path).convert("RGBA")
+    img = img.resize(size, Image.LANCZOS)
+    out = Image.alpha_composite(img, Image.fromarray(render_caption(text, size=size)))
+    return np.array(out.convert("RGB"))
 
-def create_image_with_text(image_path, text, output_path):
+def create_image_with_text(image_path, text, output_path, size=(TARGET_W, TARGET_H)):
     """
     Draws text onto the image using PIL to avoid ImageMagick dependencies.
     """
     try:
-        img = Image.open(image_path).convert("RGBA")
-        
-        # Resize to target if needed
-        target_size = (TARGET_W, TARGET_H)
-        img = img.resize(target_size, Image.ANTIALIAS)
-        
-        # Create overlay
-        overlay = Image.new('RGBA', img.size, (0,0,0,0))
-        draw = ImageDraw.Draw(overlay)
-        
-        # Font settings (Default to basic font if custom not found)
-        # Scale font size roughly proportional to width (60 for 1080 -> ~40 for 720)
-        try:
-            # Try load a clean font usually on Windows
-            font = ImageFont.truetype("arial.ttf", 40)
-        except:
-            font = ImageFont.load_default()
-            
-        # Wrap text - Scale width (30 for 1080 -> ~20 for 720 chars? actually font is smaller so char count might be similar)
-        # Let's keep 30, it fits
-        wrapper = textwrap.TextWrapper(width=30) 
-        lines = wrapper.wrap(text)
-        
-        # Draw Box at bottom
-        # Calculate text height
-        # Simple estimation: 50px per line (scaled down from 70)
-        text_height = len(lines) * 50
-        box_top = (TARGET_H - 300) - 20 # Approx position
-        box_bottom = box_top + text_height + 40
-        
-        # Semi-transparent background
-        # Scale margin: 50 -> 35
-        draw.rectangle([(35, box_top), (TARGET_W - 35, box_bottom)], fill=(0,0,0,160))
-        
-        # Draw text
-        y = box_top + 10
-        for line in lines:
-            # Center text approximately
-            # PIL default font doesn't support getsize well in newer versions, keeping simple
-            draw.text((60, y), line, font=font, fill=(255,255,255,255))
-            y += 50
-            
-        # Composite
-        out = Image.alpha_composite(img, overlay)
-        
-        # Only convert to RGB if saving as JPG (which doesn't support alpha)
-        # or if explicitly not keeping alpha.
-        if output_path.lower().endswith(".jpg") or output_path.lower().endswith(".jpeg"):
-            out = out.convert("RGB")
-        # For PNG, we keep RGBA so it can be used as a transparent overlay
-        
+        out = Image.fromarray(compose_caption(image_path, text, size))
         out.save(output_path)
         return True
     except Exception as e:
         print(f"PIL Text Error: {e}")
         return False
 
-def make_video(script_data, assets_dir, output_file):
+def _write_caption_overlay(text, work_dir, size=(TARGET_W, TARGET_H)):
+    # ffmpeg needs a file; name it by content so it is encoded once per caption and shared by workers
+    captions_dir = os.path.join(work_dir, "captions")
+    os.makedirs(captions_dir, exist_ok=True)
+    key = hashlib.sha1(f"{text}|{CAPTION_FONT}|{CAPTION_FONT_SIZE}|{size[0]}x{size[1]}".encode("utf-8")).hexdigest()
+    overlay_path = os.path.join(captions_dir, f"{key}.png")
+    if not os.path.exists(overlay_path):
+        tmp_path = f"{overlay_path}.{os.getpid()}.png"
+        Image.fromarray(render_caption(text, size=size)).save(tmp_path)
+        os.replace(tmp_path, overlay_path)
+    return overlay_path
+
+def motion_schedule(preset, frames, size=(TARGET_W, TARGET_H), supersample=MOTION_SUPERSAMPLE):
+    """
+    Precomputed crop schedule for a still moving by `preset`: source row and column indices for
+    every output frame, as (frames, H) and (frames, W) arrays into the image prepared at
+    `supersample` times the frame size. Same window as the zoompan expressions in _zoompan.
+    """
+    (z0, z1), (x0, x1), (y0, y1) = MOTION_PRESETS[preset]
+    width, height = size
+    src_w, src_h = width * supersample, height * supersample
+    p = np.linspace(0.0, 1.0, frames) if frames > 1 else np.zeros(1)
+    zoom = z0 + (z1 - z0) * p
+    crop_w, crop_h = src_w / zoom, src_h / zoom
+    left = (x0 + (x1 - x0) * p) * (src_w - crop_w)
+    top = (y0 + (y1 - y0) * p) * (src_h - crop_h)
+    # Nearest sample at each output pixel centre
+    cols = left[:, None] + (np.arange(width)[None, :] + 0.5) * (crop_w / width)[:, None]
+    rows = top[:, None] + (np.arange(height)[None, :] + 0.5) * (crop_h / height)[:, None]
+    return np.minimum(rows, src_h - 1).astype(np.intp), np.minimum(cols, src_w - 1).astype(np.intp)
+
+def motion_clip(image_path, text, duration, preset, size=(TARGET_W, TARGET_H)):
+    """
+    Still image moving by `preset` with its caption held in place, as a MoviePy clip. Each frame is
+    two gathers into the pre-resized image plus a blend over the caption box rows, so there is no
+    per-frame resample.
+    """
+    width, height = size
+    frames = max(int(round(duration * FPS)), 1)
+    rows, cols = motion_schedule(preset, frames, size)
+    img = Image.open(image_path).convert("RGB")
+    img = img.resize((width * MOTION_SUPERSAMPLE, height * MOTION_SUPERSAMPLE), Image.LANCZOS)
+    # Packed RGB rows: gathering byte columns is cheaper than a take over the (H, W, 3) array
+    source = np.asarray(img).reshape(img.height, -1)
+    channels = np.arange(3)
+
+    caption = render_caption(text, size=size)
+    box = np.flatnonzero(caption[:, :, 3].any(axis=1))
+    top, bottom = (box[0], box[-1] + 1) if len(box) else (0, 0)
+    alpha = caption[top:bottom, :, 3:].astype(np.float32) / 255
+    keep, tinted = 1 - alpha, caption[top:bottom, :, :3] * alpha
+
+    def make_frame(t):
+        n = min(int(t * FPS + 0.5), frames - 1)
+        frame = source.take(rows[n], axis=0).take((cols[n][:, None] * 3 + channels).ravel(), axis=1)
+        frame = frame.reshape(height, width, 3)
+        if bottom > top:
+            frame[top:bottom] = (frame[top:bottom] * keep + tinted).astype(np.uint8)
+        return frame
+
+    return mpy.VideoClip(make_frame, duration=duration)
+
+def _zoompan(preset, frames, size):
+    # ffmpeg's version of motion_schedule, evaluated per output frame `on`
+    (z0, z1), (x0, x1), (y0, y1) = MOTION_PRESETS[preset]
+    p = f"on/{max(frames - 1, 1)}"
+    return (
+        f"zoompan=z='{z0}+{z1 - z0:.4f}*{p}'"
+        f":x='({x0}+{x1 - x0:.4f}*{p})*(iw-iw/zoom)':y='({y0}+{y1 - y0:.4f}*{p})*(ih-ih/zoom)'"
+        f":d={frames}:s={size[0]}x{size[1]}:fps={FPS}"
+    )
+
+def _motion_for(seg, motion):
+    # A script may pick a preset per segment; unknown names fall back to the render default
+    preset = seg.get("motion")
+    return preset if preset in MOTION_PRESETS else motion
+
+def _segment_duration(voiceover):
+    # Whole frames, so every backend's video and the audio stage's track agree segment by segment
+    return max(round((voiceover + PADDING) * FPS), 1) / FPS
+
+def select_profile(queue_depth):
+    """Encoder profile for a render started with `queue_depth` jobs waiting: faster when busy, smaller when idle."""
+    for depth, profile in PROFILE_BY_QUEUE_DEPTH:
+        if queue_depth >= depth:
+            return profile
+    return DEFAULT_PROFILE
+
+def output_specs(output_file, profile=DEFAULT_PROFILE):
+    """
+    make_video's outputs as full specs. `output_file` is a path, encoded with `profile`, or a list of
+    {"path": ..., "profile": ...} dicts that may also override any ENCODER_PROFILES field, e.g. "crf".
+    """
+    specs = output_file if isinstance(output_file, (list, tuple)) else [{"path": output_file, "profile": profile}]
+    if not specs:
+        raise ValueError("No outputs given")
+    resolved = []
+    for spec in specs:
+        name = spec.get("profile", DEFAULT_PROFILE)
+        if name not in ENCODER_PROFILES:
+            raise ValueError(f"Unknown encoder profile: {name}")
+        spec = {**ENCODER_PROFILES[name], **spec, "profile": name}
+        spec["size"] = tuple(spec["size"])
+        resolved.append(spec)
+    return resolved
+
+def _composite_size(outputs):
+    # Compose once at the largest rendition; the others are scaled down from it by their encoders
+    return max((spec["size"] for spec in outputs), key=lambda size: size[0] * size[1])
+
+def make_video(script_data, assets_dir, output_file, backend="moviepy", workers=None, motion=DEFAULT_MOTION, profile=DEFAULT_PROFILE, work_dir=None):
+    """
+    Renders the script's segments into output_file.
+    backend="moviepy" composites frames in Python; backend="ffmpeg" compiles the same
+    timeline into one ffmpeg filter graph and lets ffmpeg do all the work;
+    backend="parallel" encodes segments on `workers` processes and joins them without re-encoding;
+    backend="streaming" is the MoviePy path with memory bounded by one segment, for long scripts.
+    Image segments move by `motion` (one of MOTION_PRESETS) unless the segment sets its own "motion".
+    `profile` picks the ENCODER_PROFILES entry; the render span records its encode fps and output size.
+    output_file may also be a list of output specs (see output_specs), e.g. a 1080x1920 master, a 720x1280
+    copy and a preview: the timeline is decoded and composited once and fanned out to one encoder per
+    output. Outputs are scaled from the largest, so they should share its 9:16 aspect ratio.
+    Every backend renders video only and muxes one soundtrack from the audio stage (src/audio.py):
+    the voiceovers joined and loudness-normalised, over a ducked bed for the script's "music_mood".
+    Intermediates (segment files, caption overlays, the soundtrack) go to work_dir, assets_dir by default.
+    """
+    outputs = output_specs(output_file, profile)
+    work_dir = work_dir or assets_dir
+    os.makedirs(work_dir, exist_ok=True)
+    renderers = {
+        "moviepy": lambda: _make_video_moviepy(script_data, assets_dir, work_dir, outputs, motion),
+        "ffmpeg": lambda: _make_video_ffmpeg(script_data, assets_dir, work_dir, outputs, motion),
+        "parallel": lambda: _make_video_parallel(script_data, assets_dir, work_dir, outputs, workers, motion),
+        "streaming": lambda: _make_video_streaming(script_data, assets_dir, work_dir, outputs, motion),
+    }
+    if backend not in renderers:
+        raise ValueError(f"Unknown render backend: {backend}")
+    if motion not in MOTION_PRESETS:
+        raise ValueError(f"Unknown motion preset: {motion}")
+
+    with metrics.span("render", backend=backend, profile=",".join(spec["profile"] for spec in outputs), renditions=len(outputs)) as span:
+        success = renderers[backend]()
+        span.set(ok=success)
+    if success:
+        # Encode throughput of the whole render, in composited frames per wall-clock second
+        frames = ffmpeg.probe_duration(outputs[0]["path"]) * FPS
+        output_bytes = sum(os.path.getsize(spec["path"]) for spec in outputs)
+        span.set(frames=int(frames), encode_fps=round(frames / span.wall, 1) if span.wall else None, output_bytes=output_bytes)
+    return success
+
+def _moviepy_segment(i, seg, assets_dir, motion=DEFAULT_MOTION, size=(TARGET_W, TARGET_H)):
+    """
+    One segment as a silent MoviePy clip, the readers to close once it has been written and its
+    (voiceover, duration) for the audio stage. None when the segment has no audio or no visual.
+    """
+    audio_path = os.path.join(assets_dir, f"{i}_audio.mp3")
+    visual_img_path = os.path.join(assets_dir, f"{i}_visual.jpg")
+    visual_vid_path = os.path.join(assets_dir, f"{i}_visual.mp4")
+
+    if not os.path.exists(audio_path):
+        return None
+    width, height = size
+
+    # Determine Visual Source (Video > Image)
+    visual_clip = None
+    has_video = os.path.exists(visual_vid_path) and os.path.getsize(visual_vid_path) > 0
+    has_image = os.path.exists(visual_img_path)
+    preset = _motion_for(seg, motion)
+
+    voiceover = get_audio_duration(audio_path)
+    if not voiceover:
+        return None
+    readers = []
+    duration = _segment_duration(voiceover)
+
+    if has_video:
+        # Load Video
+        visual_clip = mpy.VideoFileClip(visual_vid_path)
+        readers.append(visual_clip)
+        # Loop if too short, cut if too long
+        if visual_clip.duration < duration:
+            visual_clip = vfx.loop(visual_clip, duration=duration)
+        visual_clip = visual_clip.subclip(0, duration)
+
+        # Resize/Crop to the frame
+        if visual_clip.h != height:
+            visual_clip = visual_clip.resize(height=height)
+        if visual_clip.w > width:
+            visual_clip = visual_clip.crop(x1=visual_clip.w/2 - width/2, x2=visual_clip.w/2 + width/2)
+
+        # Force RGB to avoid alpha issues
+        visual_clip = visual_clip.to_RGB()
+
+        # Transparent caption overlay, rendered in memory
+        overlay_clip = mpy.ImageClip(render_caption(seg['text'], size=size), transparent=True).set_duration(duration)
+
+        # Composite: Visual (WebM/MP4) + Overlay (PNG)
+        visual_clip = mpy.CompositeVideoClip([visual_clip, overlay_clip], size=size)
+
+    elif has_image and preset != "static":
+        # Moving still, caption held in place
+        try:
+            visual_clip = motion_clip(visual_img_path, seg['text'], duration, preset, size)
+        except Exception as e:
+            print(f"Motion Error {i}: {e}") # Falls back to the static still below
+
+    if visual_clip is None and has_image:
+        # Fallback to Image
+        # Burn text into image using PIL, in memory
+        try:
+            frame = compose_caption(visual_img_path, seg['text'], size)
+        except Exception as e:
+            print(f"PIL Text Error: {e}")
+            frame = visual_img_path
+        visual_clip = mpy.ImageClip(frame).set_duration(duration)
+    elif visual_clip is None:
+        return None
+
+    # Common processing
+    visual_clip = visual_clip.fadein(FADE).fadeout(FADE)
+
+    # Final Safety Resize
+    if visual_clip.h != height:
+         visual_clip = visual_clip.resize(height=height)
+    if visual_clip.w != width:
+         visual_clip = visual_clip.crop(x1=visual_clip.w/2 - width/2, x2=visual_clip.w/2 + width/2)
+
+    return visual_clip, readers, (audio_path, duration)
+
+def _close_all(readers):
+    for r in readers:
+        try: r.close()
+        except: pass
+
+def _make_video_moviepy(script_data, assets_dir, work_dir, outputs, motion=DEFAULT_MOTION):
+    _patch_pillow()
+    size = _composite_size(outputs)
     clips = []
+    readers = []
+    voiceovers = []
     segments = script_data.get("segments", [])
     
     for i, seg in enumerate(segments):
-        audio_path = os.path.join(assets_dir, f"{i}_audio.mp3")
-        visual_img_path = os.path.join(assets_dir, f"{i}_visual.jpg")
-        visual_vid_path = os.path.join(assets_dir, f"{i}_visual.mp4")
-        titled_visual_path = os.path.join(assets_dir, f"{i}_visual_titled.jpg")
-        
-        if not os.path.exists(audio_path):
-            continue
-            
-        # Determine Visual Source (Video > Image)
-        visual_clip = None
-        has_video = os.path.exists(visual_vid_path) and os.path.getsize(visual_vid_path) > 0
-        has_image = os.path.exists(visual_img_path)
-        
         try:
-            audio_clip = AudioFileClip(audio_path)
-            duration = audio_clip.duration + 0.5 # Padding
-            
-            if has_video:
-                # Load Video
-                visual_clip = VideoFileClip(visual_vid_path)
-                # Loop if too short, cut if too long
-                if visual_clip.duration < duration:
-                    visual_clip = vfx.loop(visual_clip, duration=duration)
-                visual_clip = visual_clip.subclip(0, duration)
-                
-                # Resize/Crop to TARGET
-                if visual_clip.h != TARGET_H:
-                    visual_clip = visual_clip.resize(height=TARGET_H)
-                if visual_clip.w > TARGET_W:
-                    visual_clip = visual_clip.crop(x1=visual_clip.w/2 - TARGET_W/2, x2=visual_clip.w/2 + TARGET_W/2)
-                
-                # Force RGB to avoid alpha issues
-                visual_clip = visual_clip.to_RGB()
-
-                # Create transparent text overlay using PIL
-                # Temp dummy image for sizing
-                dummy_path = os.path.join(assets_dir, "temp_size.png")
-                Image.new('RGBA', (TARGET_W, TARGET_H), (0,0,0,0)).save(dummy_path)
-                overlay_path = os.path.join(assets_dir, f"{i}_overlay.png")
-                create_image_with_text(dummy_path, seg['text'], overlay_path)
-                 
-                # Create Overlay Clip
-                overlay_clip = ImageClip(overlay_path, transparent=True).set_duration(duration)
-                 
-                # Composite: Visual (WebM/MP4) + Overlay (PNG)
-                visual_clip = CompositeVideoClip([visual_clip, overlay_clip], size=(TARGET_W, TARGET_H))
-
-            elif has_image:
-                # Fallback to Image
-                # Burn text into image using PIL
-                success = create_image_with_text(visual_img_path, seg['text'], titled_visual_path)
-                source_img = titled_visual_path if success else visual_img_path
-                visual_clip = ImageClip(source_img).set_duration(duration)
-            else:
-                continue
-
-            # Common processing
-            visual_clip = visual_clip.set_audio(audio_clip)
-            visual_clip = visual_clip.fadein(0.5).fadeout(0.5)
-            
-            # Final Safety Resize
-            if visual_clip.h != TARGET_H:
-                 visual_clip = visual_clip.resize(height=TARGET_H)
-            if visual_clip.w != TARGET_W:
-                 visual_clip = visual_clip.crop(x1=visual_clip.w/2 - TARGET_W/2, x2=visual_clip.w/2 + TARGET_W/2)
-            
-            clips.append(visual_clip)
+            segment = _moviepy_segment(i, seg, assets_dir, motion, size)
         except Exception as e:
             print(f"Clip Error {i}: {e}")
+            continue
+        if segment:
+            clips.append(segment[0])
+            readers += segment[1]
+            voiceovers.append(segment[2])
             
     if clips:
+        track = audio.build_track(voiceovers, work_dir, script_data.get("music_mood"))
+        if not track:
+            _close_all(clips + readers)
+            return False
         # Use compose to fix black screens
         try:
-            final_video = concatenate_videoclips(clips, method="compose")
-            # OPTIMIZATION: preset="ultrafast", threads=4
-            final_video.write_videofile(output_file, fps=24, codec="libx264", audio_codec="aac", preset="ultrafast", threads=4)
+            final_video = mpy.concatenate_videoclips(clips, method="compose")
+            # Frames are piped to ffmpeg, which encodes every output and muxes the finished soundtrack
+            writer = _RenditionWriter(outputs, size)
+            try:
+                writer.write_clip(final_video)
+                writer.finish(track)
+            finally:
+                writer.close()
             
-            for c in clips:
-                 try: c.close()
-                 except: pass
+            _close_all(clips + readers)
             
             return True
         except Exception as e:
             print(f"Render Error: {e}")
             
     return False
+
+class _RenditionWriter:
+    """
+    Raw RGB frames in, every output's video encoded by one ffmpeg process; finish() muxes the audio
+    stage's track into each output. close() removes the temporary files.
+    """
+
+    def __init__(self, outputs, size):
+        self.outputs = outputs
+        self.video_tmps = [spec["path"] + ".video.mp4" for spec in outputs]
+        args = ["-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{size[0]}x{size[1]}", "-r", str(FPS), "-i", "-"]
+        for spec, tmp in zip(outputs, self.video_tmps):
+            args += ["-map", "0:v", *_video_encode_args(spec), tmp]
+        self.process = ffmpeg.open_writer(args)
+
+    def write_clip(self, clip):
+        for n in range(int(round(clip.duration * FPS))):
+            frame = clip.get_frame(n / FPS)
+            self.process.stdin.write(np.ascontiguousarray(frame[:, :, :3], dtype=np.uint8).tobytes())
+
+    def finish(self, track):
+        ffmpeg.close_writer(self.process)
+        for spec, tmp in zip(self.outputs, self.video_tmps):
+            ffmpeg.run([
+                "-i", tmp, "-i", track, "-map", "0:v", "-map", "1:a",
+                "-c:v", "copy", *_audio_encode_args(spec), "-movflags", "+faststart", spec["path"],
+            ])
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        for tmp in self.video_tmps:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+def _make_video_streaming(script_data, assets_dir, work_dir, outputs, motion=DEFAULT_MOTION):
+    """
+    MoviePy compositing with memory bounded by one segment: each segment's readers are opened,
+    its frames piped to a single ffmpeg encoder, then everything is closed before the next segment.
+    The audio stage's track is muxed in at the end.
+    """
+    _patch_pillow()
+    size = _composite_size(outputs)
+    writer = _RenditionWriter(outputs, size)
+    voiceovers = []
+    try:
+        for i, seg in enumerate(script_data.get("segments", [])):
+            with metrics.span("segment_render", index=i):
+                try:
+                    segment = _moviepy_segment(i, seg, assets_dir, motion, size)
+                except Exception as e:
+                    print(f"Clip Error {i}: {e}")
+                    continue
+                if not segment:
+                    continue
+                clip, readers, voiceover = segment
+                try:
+                    writer.write_clip(clip)
+                    voiceovers.append(voiceover)
+                finally:
+                    _close_all([clip] + readers)
+                    # MoviePy clips sit in reference cycles; without a collection each finished
+                    # segment's readers and frame buffers linger and memory grows with length
+                    del clip, readers, segment
+                    gc.collect()
+        if not voiceovers:
+            return False
+        track = audio.build_track(voiceovers, work_dir, script_data.get("music_mood"))
+        if not track:
+            return False
+        writer.finish(track)
+        return True
+    except Exception as e:
+        print(f"Render Error: {e}")
+        return False
+    finally:
+        writer.close()
+
+def _segment_sources(script_data, assets_dir, motion=DEFAULT_MOTION):
+    """Resolves each segment's files with the same Video > Image preference as the MoviePy path."""
+    sources = []
+    for i, seg in enumerate(script_data.get("segments", [])):
+        audio_path = os.path.join(assets_dir, f"{i}_audio.mp3")
+        visual_img_path = os.path.join(assets_dir, f"{i}_visual.jpg")
+        visual_vid_path = os.path.join(assets_dir, f"{i}_visual.mp4")
+
+        if not os.path.exists(audio_path):
+            continue
+        duration = get_audio_duration(audio_path)
+        if not duration:
+            continue
+
+        source = {"index": i, "text": seg.get("text", ""), "audio": audio_path, "duration": _segment_duration(duration)}
+        if os.path.exists(visual_vid_path) and os.path.getsize(visual_vid_path) > 0:
+            source["video"] = visual_vid_path
+        elif os.path.exists(visual_img_path):
+            source["image"] = visual_img_path
+            source["motion"] = _motion_for(seg, motion)
+        else:
+            continue
+        sources.append(source)
+    return sources
+
+def _segment_graph(source, inputs, label, work_dir, size=(TARGET_W, TARGET_H)):
+    """
+    Appends the segment's ffmpeg inputs to `inputs` and returns its filter chains, which end in the
+    video pad [v{label}]. The voiceover is the audio stage's.
+    """
+    def add_input(*args):
+        inputs.append(list(args))
+        return len(inputs) - 1
+
+    i = source["index"]
+    d = source["duration"]
+    width, height = size
+    fades = f"fade=t=in:st=0:d={FADE},fade=t=out:st={max(d - FADE, 0):.3f}:d={FADE}"
+    chains = []
+
+    if "video" in source:
+        v = add_input("-stream_loop", "-1", "-t", f"{d:.3f}", "-i", source["video"])
+        chains.append(
+            f"[{v}:v]fps={FPS},scale=-2:{height},crop='min(iw,{width})':{height},"
+            f"pad={width}:{height}:(ow-iw)/2:0,setsar=1,trim=duration={d:.3f}[bg{label}]"
+        )
+        overlay = add_input("-i", _write_caption_overlay(source["text"], work_dir, size))
+        chains.append(f"[bg{label}][{overlay}:v]overlay=0:0,format=yuv420p,{fades}[v{label}]")
+    elif source.get("motion", "static") != "static":
+        # One decoded frame, zoompan emits every output frame from it; the caption stays put on top
+        frames = max(int(round(d * FPS)), 1)
+        v = add_input("-i", source["image"])
+        chains.append(
+            f"[{v}:v]scale={width * MOTION_SUPERSAMPLE}:{height * MOTION_SUPERSAMPLE},"
+            f"{_zoompan(source['motion'], frames, size)},setsar=1,trim=duration={d:.3f}[bg{label}]"
+        )
+        overlay = add_input("-i", _write_caption_overlay(source["text"], work_dir, size))
+        chains.append(f"[bg{label}][{overlay}:v]overlay=0:0,format=yuv420p,{fades}[v{label}]")
+    else:
+        titled_path = os.path.join(work_dir, f"{i}_visual_titled.jpg")
+        success = create_image_with_text(source["image"], source["text"], titled_path, size)
+        v = add_input("-loop", "1", "-framerate", str(FPS), "-t", f"{d:.3f}", "-i", titled_path if success else source["image"])
+        chains.append(f"[{v}:v]scale={width}:{height},setsar=1,format=yuv420p,{fades}[v{label}]")
+
+    return chains
+
+def _video_encode_args(spec, threads=None):
+    width, height = spec["size"]
+    threads = spec["threads"] if threads is None else threads
+    return [
+        "-r", str(FPS), "-s", f"{width}x{height}", "-c:v", "libx264", "-preset", spec["preset"],
+        "-crf", str(spec["crf"]), "-pix_fmt", "yuv420p", "-threads", str(threads),
+    ]
+
+def _audio_encode_args(spec):
+    return ["-c:a", "aac", "-b:a", spec["audio_bitrate"], "-ar", str(AUDIO_RATE), "-ac", "2"]
+
+def _encode_args(spec, threads=None):
+    # One output's video and audio settings, for backends that encode the soundtrack alongside the video
+    return [*_video_encode_args(spec, threads), *_audio_encode_args(spec)]
+
+def _fan_out(video_pad, count):
+    """
+    Chains splitting the final video pad into one per output (a filter pad feeds one consumer), and
+    the -map argument for each output.
+    """
+    if count == 1:
+        return [], [["-map", f"[{video_pad}]"]]
+    chains = [f"[{video_pad}]split={count}" + "".join(f"[{video_pad}{k}]" for k in range(count))]
+    return chains, [["-map", f"[{video_pad}{k}]"] for k in range(count)]
+
+def _make_video_ffmpeg(script_data, assets_dir, work_dir, outputs, motion=DEFAULT_MOTION):
+    sources = _segment_sources(script_data, assets_dir, motion)
+    if not sources:
+        return False
+
+    track = audio.build_track([(s["audio"], s["duration"]) for s in sources], work_dir, script_data.get("music_mood"))
+    if not track:
+        return False
+
+    size = _composite_size(outputs)
+    inputs = []
+    chains = []
+    for n, source in enumerate(sources):
+        chains.extend(_segment_graph(source, inputs, n, work_dir, size))
+    pads = "".join(f"[v{n}]" for n in range(len(sources)))
+    chains.append(f"{pads}concat=n={len(sources)}:v=1:a=0[vout]")
+    split, maps = _fan_out("vout", len(outputs))
+
+    args = [arg for input_args in inputs for arg in input_args] + ["-i", track]
+    args += ["-filter_complex", ";".join(chains + split)]
+    for spec, output_maps in zip(outputs, maps):
+        args += output_maps + ["-map", f"{len(inputs)}:a"] + _encode_args(spec) + ["-movflags", "+faststart", spec["path"]]
+    try:
+        ffmpeg.run(args)
+        return True
+    except Exception as e:
+        print(f"Render Error: {e}")
+        return False
+
+def _segment_fingerprint(source, spec, size):
+    # Content, not mtime: cached assets are hard links whose mtime moves on every cache hit
+    h = hashlib.sha1(f"{SEGMENT_RENDER_VERSION}|{source['text']}|{source['duration']:.3f}|{source.get('motion')}|{size}".encode("utf-8"))
+    # Segments are video only; the voiceover counts through the duration alone
+    for kind in ("video", "image"):
+        if kind in source:
+            h.update(f"|{kind}:{audio.file_digest(source[kind])}".encode())
+    h.update(" ".join(_video_encode_args(spec, threads=1)).encode())
+    return h.hexdigest()[:16]
+
+def _render_segment(source, work_dir, renditions, size):
+    """Encodes one segment's video to a file per output, from one composite. Runs in a worker process."""
+    inputs = []
+    chains = _segment_graph(source, inputs, 0, work_dir, size)
+    split, maps = _fan_out("v0", len(renditions))
+    args = [arg for input_args in inputs for arg in input_args]
+    args += ["-filter_complex", ";".join(chains + split)]
+    for (spec, path), output_maps in zip(renditions, maps):
+        args += output_maps + _video_encode_args(spec, threads=1) + [path + ".part.mp4"]
+    try:
+        ffmpeg.run(args)
+        for _, path in renditions:
+            os.replace(path + ".part.mp4", path)
+        return True
+    except Exception as e:
+        print(f"Segment Render Error {source['index']}: {e}")
+        return False
+
+def _make_video_parallel(script_data, assets_dir, work_dir, outputs, workers=None, motion=DEFAULT_MOTION):
+    sources = _segment_sources(script_data, assets_dir, motion)
+    if not sources:
+        return False
+
+    size = _composite_size(outputs)
+    segments_dir = os.path.join(work_dir, "segments")
+    os.makedirs(segments_dir, exist_ok=True)
+
+    segment_files = [[] for _ in outputs] # per output, in timeline order
+    pending = []
+    for source in sources:
+        renditions = [
+            (spec, os.path.join(segments_dir, f"{source['index']}_{_segment_fingerprint(source, spec, size)}.mp4"))
+            for spec in outputs
+        ]
+        for files, (_, path) in zip(segment_files, renditions):
+            files.append(path)
+        if all(os.path.exists(path) for _, path in renditions):
+            continue # Inputs unchanged since the last render
+        keep = {os.path.basename(path) for _, path in renditions}
+        for old in os.listdir(segments_dir):
+            if old.startswith(f"{source['index']}_") and old not in keep:
+                os.remove(os.path.join(segments_dir, old))
+        # Outputs that differ only in path share a segment file; encode it once
+        pending.append((source, list({path: (spec, path) for spec, path in renditions}.values())))
+
+    mood = script_data.get("music_mood")
+    voiceovers = [(s["audio"], s["duration"]) for s in sources]
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            futures = [pool.submit(_render_segment, source, work_dir, renditions, size) for source, renditions in pending]
+            # The audio stage runs here while the workers encode
+            track = audio.build_track(voiceovers, work_dir, mood)
+            results = [f.result() for f in futures]
+        if not all(results):
+            # The soundtrack has to follow the segments that made it
+            kept = [n for n, path in enumerate(segment_files[0]) if os.path.exists(path)]
+            segment_files = [[files[n] for n in kept] for files in segment_files]
+            track = audio.build_track([voiceovers[n] for n in kept], work_dir, mood)
+    else:
+        track = audio.build_track(voiceovers, work_dir, mood)
+    print(f"Rendered {len(pending)} segment(s), reused {len(sources) - len(pending)}.")
+
+    if not segment_files[0] or not track:
+        return False
+
+    try:
+        for k, (spec, files) in enumerate(zip(outputs, segment_files)):
+            list_path = os.path.join(segments_dir, f"concat{k}.txt")
+            with open(list_path, "w", encoding="utf-8") as f:
+                for path in files:
+                    escaped = os.path.abspath(path).replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            ffmpeg.run([
+                "-f", "concat", "-safe", "0", "-i", list_path, "-i", track, "-map", "0:v", "-map", "1:a",
+                "-c:v", "copy", *_audio_encode_args(spec), "-movflags", "+faststart", spec["path"],
+            ])
+        return True
+    except Exception as e:
+        print(f"Render Error: {e}")
+        return False
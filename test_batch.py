@@ -0,0 +1,52 @@
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+from src import batch
+
+# The batch runner's stage plumbing, with stubbed stages and render pools instead of worker processes
+NEWS = {"title": "Test News", "content": "A test article."}
+SCRIPT = {"music_mood": "Test", "segments": [{"text": "One sentence.", "image_prompt": "A shot"}]}
+
+class Pool:
+    """Stands in for the render ProcessPoolExecutor: submit raises `error`, or returns a finished render."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.submits = 0
+
+    def submit(self, fn, *args):
+        self.submits += 1
+        if self.error:
+            raise self.error
+        future = Future()
+        future.set_result({"ok": True, "render_s": 0.1, "encode_fps": 100.0, "output_bytes": 1})
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+def run(monkeypatch, tmp_path, pools):
+    monkeypatch.setattr(batch.synthesis, "generate_script", lambda *args, **kwargs: SCRIPT)
+    monkeypatch.setattr(batch.BatchRunner, "_asset_stage", lambda self, job: None)
+    monkeypatch.setattr(batch.BatchRunner, "_new_render_pool", lambda self: pools.pop(0))
+    results = []
+    with batch.BatchRunner(runs_dir=str(tmp_path)) as runner:
+        # run() used to wait forever when a submit raised inside a done-callback
+        thread = threading.Thread(target=lambda: results.append(runner.run([NEWS, NEWS])), daemon=True)
+        thread.start()
+        thread.join(10)
+    assert results, "run() did not return"
+    return results[0]
+
+def test_broken_render_pool_is_replaced(monkeypatch, tmp_path):
+    broken, fresh = Pool(BrokenProcessPool("worker died")), Pool()
+    jobs = run(monkeypatch, tmp_path, [broken, fresh])
+    assert [job["status"] for job in jobs] == ["done", "done"]
+    assert broken.submits == 1
+    assert fresh.submits == 2
+
+def test_failed_render_submit_fails_the_job(monkeypatch, tmp_path):
+    jobs = run(monkeypatch, tmp_path, [Pool(BrokenProcessPool("worker died")), Pool(RuntimeError("no memory"))])
+    assert [job["status"] for job in jobs] == ["failed", "failed"]
+    assert all(job["error"].startswith("render:") for job in jobs)
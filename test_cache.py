@@ -0,0 +1,47 @@
+import os
+
+from src import cache
+
+# The content-addressed asset store, on a temp directory
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def test_copy_fallback_does_not_write_through_a_stale_tmp(tmp_path, monkeypatch):
+    store = cache.AssetCache(str(tmp_path / "store"))
+    other, src = tmp_path / "other.bin", tmp_path / "src.bin"
+    write(other, b"other entry")
+    write(src, b"new entry")
+    store.store("a" * 64, ".bin", str(other))
+    dst = store.path("b" * 64, ".bin")
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    # A crashed writer's tmp, hard linked to another entry, and a filesystem without hard links
+    os.link(store.path("a" * 64, ".bin"), cache._tmp_name(dst))
+    def no_link(*args):
+        raise OSError("hard links not supported")
+    monkeypatch.setattr(cache.os, "link", no_link)
+
+    store.store("b" * 64, ".bin", str(src))
+    assert read(dst) == b"new entry"
+    assert read(store.path("a" * 64, ".bin")) == b"other entry"
+    assert not [name for _, _, files in os.walk(store.root) for name in files if name.endswith(".tmp")]
+
+def test_stores_do_not_rescan_the_store(tmp_path, monkeypatch):
+    store = cache.AssetCache(str(tmp_path / "store"), max_bytes=10 * 1000)
+    scans = []
+    entries = cache.AssetCache._entries
+    monkeypatch.setattr(cache.AssetCache, "_entries", lambda self: scans.append(1) or entries(self))
+    for n in range(30):
+        src = tmp_path / f"src{n}.bin"
+        write(src, bytes([n]) * 1000) # one source per entry: a shared hard link would share its mtime
+        os.utime(src, (n, n))
+        store.store(f"{n:064d}", ".bin", str(src))
+    # One scan to seed the total, then one per eviction, which frees down to EVICT_TO of the limit
+    assert len(scans) == 1 + store.evictions // 2
+    assert store.stats()["bytes"] <= store.max_bytes
+    kept = sorted(name for _, _, files in os.walk(store.root) for name in files)
+    assert kept == sorted(f"{n:064d}.bin" for n in range(30 - len(kept), 30))
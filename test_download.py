@@ -0,0 +1,123 @@
+import os
+import threading
+import http.server
+
+import pytest
+
+from src import assets
+
+# Stock footage downloads against a local HTTP server
+BODY = bytes(range(256)) * 64
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    # Paths pick the behaviour: /clip honours Range, /norange ignores it, /drop cuts the first response short,
+    # /nolength sends no Content-Length
+    requests = []
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        self.requests.append((self.path, range_header))
+        start = int(range_header[len("bytes="):-1]) if range_header else 0
+        if self.path == "/missing":
+            self.send_error(404)
+            return
+        if self.path == "/norange" or not range_header:
+            start = 0
+        if start >= len(BODY):
+            self.send_error(416)
+            return
+        body = BODY[start:]
+        self.send_response(206 if start else 200)
+        if self.path != "/nolength":
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.path == "/drop" and not range_header:
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    Handler.requests = []
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def leftovers(tmp_path):
+    return sorted(name for name in os.listdir(tmp_path) if ".part" in name)
+
+def partial(output, url, data):
+    # What an interrupted download leaves behind
+    with open(output + ".part", "wb") as f:
+        f.write(data)
+    with open(output + ".part.url", "w", encoding="utf-8") as f:
+        f.write(url)
+
+def test_dropped_connection_resumes_with_range(server, tmp_path, monkeypatch):
+    # Chunks smaller than what arrives before the drop, so the partial file has something to resume from
+    monkeypatch.setattr(assets, "DOWNLOAD_CHUNK_SIZE", 1024)
+    output = str(tmp_path / "clip.mp4")
+    assert assets.download_file(f"{server}/drop", output)
+    assert read(output) == BODY
+    assert Handler.requests == [("/drop", None), ("/drop", f"bytes={len(BODY) // 2}-")]
+    assert leftovers(tmp_path) == []
+
+def test_partial_file_resumes_with_range(server, tmp_path):
+    output = str(tmp_path / "clip.mp4")
+    partial(output, f"{server}/clip", BODY[:1000])
+    assert assets.download_file(f"{server}/clip", output)
+    assert read(output) == BODY
+    assert Handler.requests == [("/clip", "bytes=1000-")]
+
+def test_server_ignoring_range_starts_over(server, tmp_path):
+    output = str(tmp_path / "clip.mp4")
+    partial(output, f"{server}/norange", BODY[:1000])
+    assert assets.download_file(f"{server}/norange", output)
+    assert read(output) == BODY
+
+def test_416_keeps_a_complete_partial_file(server, tmp_path):
+    output = str(tmp_path / "clip.mp4")
+    partial(output, f"{server}/clip", BODY)
+    assert assets.download_file(f"{server}/clip", output)
+    assert read(output) == BODY
+    assert Handler.requests == [("/clip", f"bytes={len(BODY)}-")]
+    assert leftovers(tmp_path) == []
+
+def test_partial_file_from_another_url_is_discarded(server, tmp_path):
+    output = str(tmp_path / "clip.mp4")
+    partial(output, f"{server}/other", b"x" * 1000)
+    assert assets.download_file(f"{server}/clip", output)
+    assert read(output) == BODY
+    assert Handler.requests == [("/clip", None)]
+
+def test_byte_cap(server, tmp_path):
+    output = str(tmp_path / "clip.mp4")
+    with pytest.raises(ValueError):
+        assets.download_file(f"{server}/clip", output, max_bytes=len(BODY) - 1)
+    # A resumed download counts the bytes it already has
+    partial(output, f"{server}/clip", BODY[:1000])
+    with pytest.raises(ValueError):
+        assets.download_file(f"{server}/clip", output, max_bytes=len(BODY) - 1)
+    # Without a Content-Length the cap applies while streaming
+    with pytest.raises(ValueError):
+        assets.download_file(f"{server}/nolength", output, max_bytes=len(BODY) - 1)
+    assert not os.path.exists(output)
+    assert leftovers(tmp_path) == []
+
+def test_4xx_is_not_retried(server, tmp_path):
+    output = str(tmp_path / "clip.mp4")
+    with pytest.raises(Exception):
+        assets.download_file(f"{server}/missing", output)
+    assert Handler.requests == [("/missing", None)]
+    assert leftovers(tmp_path) == []
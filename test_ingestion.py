@@ -0,0 +1,63 @@
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from src import ingestion
+
+# News ingestion with a stubbed feed and stubbed network calls
+ARTICLE = "A test article. " * 20
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    ingestion._resolved_cache.clear()
+    ingestion._text_cache.clear()
+    yield
+    ingestion._resolved_cache.clear()
+    ingestion._text_cache.clear()
+
+def stub_feed(monkeypatch, *links):
+    entries = [SimpleNamespace(title=f"Story {n}", link=link) for n, link in enumerate(links)]
+    store = SimpleNamespace(fetch=lambda url: SimpleNamespace(entries=entries))
+    monkeypatch.setattr(ingestion.feeds, "get_store", lambda: store)
+
+def test_entries_below_the_winner_stop_after_their_current_step(monkeypatch):
+    stub_feed(monkeypatch, "https://news/fast", "https://news/slow")
+    resolving = threading.Event()
+    fetched = []
+
+    def resolve_url(url):
+        if url.endswith("slow"):
+            resolving.set()
+            time.sleep(0.3) # still resolving when the first entry wins
+        else:
+            resolving.wait(1)
+        return url
+    def fetch_html(url):
+        fetched.append(url)
+        return f"<html>{url}</html>"
+    monkeypatch.setattr(ingestion, "resolve_url", resolve_url)
+    monkeypatch.setattr(ingestion, "fetch_html", fetch_html)
+    monkeypatch.setattr(ingestion.trafilatura, "extract", lambda html: ARTICLE)
+
+    article = ingestion.fetch_news_topic("Test")
+    assert article["link"] == "https://news/fast"
+    time.sleep(0.5)
+    assert fetched == ["https://news/fast"]
+
+def test_ttl_cache_is_bounded_and_sweeps_expired_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ingestion.time, "monotonic", lambda: now[0])
+    cache = ingestion.TTLCache(ttl=10, max_items=3)
+    for n in range(5):
+        cache.set(n, str(n))
+    assert list(cache._data) == [2, 3, 4] # the oldest go first
+    cache.set(3, "again") # a new set moves the key to the back
+    cache.set(5, "5")
+    assert list(cache._data) == [4, 3, 5]
+    now[0] += 11
+    cache.set(6, "6") # everything else has expired, without ever being read
+    assert list(cache._data) == [6]
+    assert cache.get(6) == (True, "6")
+    assert cache.get(4) == (False, None)
@@ -0,0 +1,114 @@
+import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from src import jobs, video
+
+# Job service behaviour that does not need a render: the queue, secrets and cancellation
+PARAMS = {"news_item": {"title": "Test News", "content": "A test article."}, "backend": "ffmpeg"}
+SCRIPT = {"music_mood": "Test", "segments": [{"text": "One sentence.", "image_prompt": "A shot"}]}
+
+def service(tmp_path):
+    # The queue alone: no dispatcher thread, no worker pool
+    svc = object.__new__(jobs.JobService)
+    svc.jobs_dir = str(tmp_path)
+    svc.db_path = os.path.join(str(tmp_path), jobs.DB_NAME)
+    svc.workers = 1
+    svc._secrets = {}
+    svc._in_flight = 0
+    svc._lock = jobs.threading.Lock()
+    svc._wakeup = jobs.threading.Event()
+    with jobs._connect(svc.db_path) as conn:
+        conn.executescript(jobs.SCHEMA)
+    return svc
+
+def test_secrets_are_in_place_before_the_job_is_queued(tmp_path):
+    svc = service(tmp_path)
+
+    class Secrets(dict):
+        def __setitem__(self, job_id, value):
+            # The dispatcher claims queued rows; none may exist yet for this job
+            assert svc.get(job_id) is None
+            super().__setitem__(job_id, value)
+
+    svc._secrets = Secrets()
+    job_id = svc.submit(PARAMS, {"GROQ_API_KEY": "q"})
+    assert svc.get(job_id)["status"] == "queued"
+    assert svc._secrets[job_id] == {"GROQ_API_KEY": "q"}
+
+def test_failed_insert_drops_the_secrets(tmp_path):
+    svc = service(tmp_path)
+    with jobs._connect(svc.db_path) as conn:
+        conn.execute("CREATE TRIGGER reject BEFORE INSERT ON jobs BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+    with pytest.raises(jobs.sqlite3.DatabaseError):
+        svc.submit(PARAMS, {"GROQ_API_KEY": "q"})
+    assert svc._secrets == {}
+
+def test_auto_profile_keeps_the_resolution():
+    assert [video.select_profile(depth) for depth in (0, 1, 3, 4, 20)] == ["standard_slow", "standard", "standard", "standard_fast", "standard_fast"]
+    sizes = {video.ENCODER_PROFILES[profile]["size"] for _, profile in video.PROFILE_BY_QUEUE_DEPTH}
+    assert sizes == {video.ENCODER_PROFILES[video.DEFAULT_PROFILE]["size"]}
+
+class Pool:
+    """Stands in for the worker ProcessPoolExecutor: submit raises `error`, or returns a pending future."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.submits = []
+
+    def submit(self, fn, *args):
+        self.submits.append(args)
+        if self.error:
+            raise self.error
+        return Future()
+
+    def shutdown(self, wait=True):
+        pass
+
+def claimed(svc):
+    job_id = svc.submit(PARAMS)
+    assert svc._claim_next() == job_id
+    svc._in_flight += 1
+    return job_id
+
+def test_broken_pool_is_replaced(tmp_path, monkeypatch):
+    svc = service(tmp_path)
+    fresh = Pool()
+    svc._pool = Pool(BrokenProcessPool("worker died"))
+    monkeypatch.setattr(jobs.JobService, "_new_pool", lambda self: fresh)
+    job_id = claimed(svc)
+    assert svc._start(job_id, {}, video.DEFAULT_PROFILE) is not None
+    assert svc._pool is fresh and len(fresh.submits) == 1
+    assert svc.get(job_id)["status"] == "running"
+
+def test_job_that_cannot_start_goes_back_to_the_queue(tmp_path, monkeypatch):
+    svc = service(tmp_path)
+    svc._pool = Pool(BrokenProcessPool("worker died"))
+    monkeypatch.setattr(jobs.JobService, "_new_pool", lambda self: Pool(RuntimeError("cannot spawn")))
+    job_id = claimed(svc)
+    assert svc._start(job_id, {}, video.DEFAULT_PROFILE) is None
+    assert svc.get(job_id)["status"] == "queued"
+    assert svc._in_flight == 0
+
+def test_cancel_during_the_render_stops_the_job(tmp_path, monkeypatch):
+    svc = service(tmp_path)
+    job_id = claimed(svc)
+
+    class AssetStream:
+        def __init__(self, *args, **kwargs):
+            pass
+        submit = close = cancel = lambda self, *args: None
+
+    def make_video(script, assets_dir, output_file, **kwargs):
+        svc.cancel(job_id) # pressed while the render, which reports no progress, was running
+        return True
+    monkeypatch.setattr(jobs.synthesis, "generate_script_stream", lambda *args, **kwargs: SCRIPT)
+    monkeypatch.setattr(jobs.assets, "AssetStream", AssetStream)
+    monkeypatch.setattr(jobs.video, "make_video", make_video)
+
+    jobs._run_job(svc.db_path, svc.jobs_dir, job_id, {})
+    job = svc.get(job_id)
+    assert job["status"] == "cancelled" and job["result"] is None
+    assert not os.path.exists(os.path.join(svc.jobs_dir, job_id, "report.md"))
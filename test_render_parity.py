@@ -0,0 +1,94 @@
+import os
+import re
+import tempfile
+
+import numpy as np
+from PIL import Image
+from moviepy.editor import VideoFileClip
+
+from src import audio, ffmpeg, video
+
+# Render parity: the native ffmpeg backends and the streaming path must produce the same video as MoviePy
+SCRIPT = {
+    "music_mood": "Test",
+    "segments": [
+        {"text": "A portrait stock clip with a caption box", "image_prompt": "portrait"},
+        {"text": "An AI image with the caption burned in", "image_prompt": "image"},
+        {"text": "A landscape clip that gets cropped to 9:16", "image_prompt": "landscape"},
+    ],
+}
+
+def make_fixtures(assets_dir):
+    for i, seconds in enumerate((2, 3, 2)):
+        ffmpeg.run(["-f", "lavfi", "-i", f"sine=frequency={300 + 100 * i}:duration={seconds}", "-ac", "1", os.path.join(assets_dir, f"{i}_audio.mp3")])
+    ffmpeg.run(["-f", "lavfi", "-i", "testsrc=size=1080x1920:rate=25:duration=2", "-pix_fmt", "yuv420p", os.path.join(assets_dir, "0_visual.mp4")])
+    ffmpeg.run(["-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30:duration=4", "-pix_fmt", "yuv420p", os.path.join(assets_dir, "2_visual.mp4")])
+
+    gradient = np.zeros((1920, 1080, 3), np.uint8)
+    gradient[..., 0] = np.linspace(0, 255, 1080)[None, :]
+    gradient[..., 2] = np.linspace(0, 255, 1920)[:, None]
+    Image.fromarray(gradient).save(os.path.join(assets_dir, "1_visual.jpg"))
+
+def frame_difference(path_a, path_b, samples=8, size=(video.TARGET_W, video.TARGET_H)):
+    a, b = VideoFileClip(path_a), VideoFileClip(path_b)
+    try:
+        assert a.size == b.size == list(size)
+        assert abs(a.duration - b.duration) < 0.25, (a.duration, b.duration)
+        # Stay clear of the fades and segment joins, where a frame of drift dominates
+        times = np.linspace(0.8, min(a.duration, b.duration) - 0.8, samples)
+        diffs = [np.abs(a.get_frame(t).astype(np.int16) - b.get_frame(t).astype(np.int16)).mean() for t in times]
+        return float(np.median(diffs))
+    finally:
+        a.close()
+        b.close()
+
+def test_native_backends_match_moviepy():
+    with tempfile.TemporaryDirectory() as tmp:
+        make_fixtures(tmp)
+        reference = os.path.join(tmp, "moviepy.mp4")
+        assert video.make_video(SCRIPT, tmp, reference, backend="moviepy")
+        assets_before = set(os.listdir(tmp))
+        for backend in ("ffmpeg", "parallel", "streaming"):
+            native = os.path.join(tmp, f"{backend}.mp4")
+            assert video.make_video(SCRIPT, tmp, native, backend=backend, work_dir=os.path.join(tmp, "render"))
+            assert frame_difference(reference, native) < 8, backend
+        # Intermediates stay in work_dir; the assets dir gains only the outputs
+        assert set(os.listdir(tmp)) - assets_before == {"render", "ffmpeg.mp4", "parallel.mp4", "streaming.mp4"}
+
+def test_renditions_match_single_renders():
+    # One composite fanned out to several outputs must equal rendering each output on its own
+    with tempfile.TemporaryDirectory() as tmp:
+        make_fixtures(tmp)
+        for backend in ("ffmpeg", "streaming"):
+            outputs = [{"path": os.path.join(tmp, f"{backend}_{p}.mp4"), "profile": p} for p in ("standard", "preview")]
+            assert video.make_video(SCRIPT, tmp, outputs, backend=backend)
+            for spec in outputs:
+                single = os.path.join(tmp, f"{backend}_{spec['profile']}_single.mp4")
+                assert video.make_video(SCRIPT, tmp, single, backend=backend, profile=spec["profile"])
+                size = video.ENCODER_PROFILES[spec["profile"]]["size"]
+                assert frame_difference(single, spec["path"], size=size) < 8, (backend, spec["profile"])
+
+def stream_duration(path, stream):
+    stderr = ffmpeg.run(["-i", path, "-map", stream, "-f", "null", "-"], capture=True).stderr
+    h, m, s = re.findall(r"time=(\d+):(\d+):([\d.]+)", stderr)[-1]
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+def test_soundtrack_is_normalized_and_in_sync(monkeypatch):
+    # Every backend muxes the audio stage's track: voice at the loudness target over the ducked bed, as long as the video
+    with tempfile.TemporaryDirectory() as tmp:
+        make_fixtures(tmp)
+        os.makedirs(os.path.join(tmp, "music", "test"))
+        ffmpeg.run(["-f", "lavfi", "-i", "anoisesrc=d=4:a=0.2", "-ac", "2", os.path.join(tmp, "music", "test", "bed.mp3")])
+        monkeypatch.setattr(audio, "MUSIC_DIR", os.path.join(tmp, "music"))
+        for backend in ("ffmpeg", "parallel", "streaming"):
+            output = os.path.join(tmp, f"{backend}.mp4")
+            assert video.make_video(SCRIPT, tmp, output, backend=backend)
+            stats = audio._parse_loudnorm(ffmpeg.run(["-i", output, "-af", "loudnorm=print_format=json", "-f", "null", "-"], capture=True).stderr)
+            assert abs(float(stats["input_i"]) - audio.LOUDNESS_I) < 1, (backend, stats["input_i"])
+            assert abs(stream_duration(output, "0:a") - stream_duration(output, "0:v")) < 0.05, backend
+
+if __name__ == "__main__":
+    print("Testing render parity (moviepy vs ffmpeg/parallel)...")
+    test_native_backends_match_moviepy()
+    test_renditions_match_single_renders()
+    print("SUCCESS: backends match.")
@@ -0,0 +1,70 @@
+import json
+import time
+
+import pytest
+
+from src import synthesis
+
+# Script routing and hedging, with stubbed providers instead of the Gemini and Groq APIs
+NEWS = {"title": "Test News", "content": "A test article."}
+SCRIPT = {"music_mood": "Test", "segments": [{"text": "One sentence.", "image_prompt": "A shot"}]}
+
+def provider(seconds, script=SCRIPT):
+    def call(*args):
+        time.sleep(seconds)
+        if isinstance(script, Exception):
+            raise script
+        return script
+    return call
+
+@pytest.fixture(autouse=True)
+def fresh_router(monkeypatch):
+    monkeypatch.setattr(synthesis, "router", synthesis.ProviderRouter())
+    monkeypatch.setattr(synthesis, "batch_router", synthesis.ProviderRouter())
+    monkeypatch.setattr(synthesis, "HEDGE_DEFAULT_S", 0.2)
+
+def generate(monkeypatch, gemini=None, groq=None):
+    if gemini:
+        monkeypatch.setattr(synthesis, "generate_script_gemini", gemini)
+    if groq:
+        monkeypatch.setattr(synthesis, "generate_script_groq", groq)
+    return synthesis.generate_script(NEWS, gemini_key="g" if gemini else None, groq_key="q" if groq else None, use_cache=False)
+
+def test_single_provider_past_its_deadline(monkeypatch):
+    assert generate(monkeypatch, groq=provider(0.5)) == SCRIPT
+
+def test_every_provider_past_its_deadline(monkeypatch):
+    assert generate(monkeypatch, gemini=provider(0.5), groq=provider(0.6)) == SCRIPT
+    assert synthesis.router.hedges == 1
+    # The straggler still reports its latency; wait for it so it does not land in the next test's router
+    for _ in range(50):
+        if "groq" in synthesis.router.stats():
+            break
+        time.sleep(0.05)
+    assert synthesis.router.stats()["groq"]["calls"] == 1
+
+def test_failed_provider_falls_back(monkeypatch):
+    assert generate(monkeypatch, gemini=provider(0.05, RuntimeError("quota")), groq=provider(0.05)) == SCRIPT
+    assert synthesis.router.error_rate("gemini") == 1.0
+    assert synthesis.router.hedges == 0
+
+def test_invalid_scripts_return_none(monkeypatch):
+    assert generate(monkeypatch, gemini=provider(0.05, {"segments": []}), groq=provider(0.3, None)) is None
+
+def test_batch_latency_stays_out_of_single_script_routing(monkeypatch):
+    def batch_call(provider, api_key, news_items):
+        time.sleep(0.1)
+        return [dict(SCRIPT, id=n) for n in range(len(news_items))]
+    monkeypatch.setattr(synthesis, "_batch_call", batch_call)
+    scripts = synthesis.generate_scripts([NEWS] * 4, groq_key="q", batch_size=4, use_cache=False)
+    assert scripts == [SCRIPT] * 4
+    assert synthesis.batch_router.stats()["groq"]["calls"] == 1
+    assert "groq" not in synthesis.router.stats()
+
+def test_segments_need_an_image_prompt():
+    for seg in ({"text": "One sentence."}, {"text": "One sentence.", "image_prompt": ""}, {"text": "One sentence.", "image_prompt": ["A shot"]}):
+        assert not synthesis.valid_script({"music_mood": "Test", "segments": [seg]}), seg
+        parser = synthesis.SegmentStreamParser()
+        assert parser.feed('{"music_mood": "Test", "segments": [' + json.dumps(seg) + "]}") == []
+        assert synthesis.split_batch({"scripts": [{"id": 0, "segments": [seg]}]}, 1) == [None]
+    assert synthesis.split_batch({"scripts": [dict(SCRIPT, id=0)]}, 1) == [SCRIPT]